@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from core.slow_queries import FIELDS, get_stores, top_fingerprints
+
+
+class Command(BaseCommand):
+    help = (
+        'Выводит отпечатки SQL с наибольшим суммарным временем за текущее '
+        'и прошлое окно SLOW_QUERY_WINDOW. Число и сумма быстрых запросов '
+        'оценены по выборке SLOW_QUERY_SAMPLE_RATE, медленные учтены все.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--order', choices=FIELDS, default='seconds')
+        parser.add_argument(
+            '--width', type=int, default=160,
+            help='Сколько символов отпечатка выводить, 0 — весь.',
+        )
+        parser.add_argument(
+            '--reset', action='store_true', help='Очистить итоги.'
+        )
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            for store in get_stores():
+                store.reset()
+            self.stdout.write('Итоги очищены')
+            return
+        rows = top_fingerprints(options['limit'], options['order'])
+        if not rows:
+            self.stdout.write('Запросов пока нет')
+            return
+        self.stdout.write(
+            f'{"всего, с":>10}{"запросов":>10}{"среднее, мс":>13}'
+            f'{"макс, мс":>10}{"медленных":>11}  отпечаток'
+        )
+        width = options['width']
+        for sql, total in rows:
+            mean = total['seconds'] / total['count'] if total['count'] else 0
+            if width and len(sql) > width:
+                sql = sql[:width - 1] + '…'
+            self.stdout.write(
+                f'{total["seconds"]:>10.2f}{total["count"]:>10.0f}'
+                f'{mean * 1000:>13.2f}{total["max_seconds"] * 1000:>10.1f}'
+                f'{total["slow"]:>11.0f}  {sql}'
+            )
@@ -0,0 +1,315 @@
+"""Метрики запросов по именам представлений.
+
+MetricsMiddleware замеряет каждый ответ: время, число и время запросов
+к базе, время отрисовки шаблонов и размер тела. Счётчики лежат в файле
+METRICS_FILE, отображённом в память через mmap, поэтому их видят все
+процессы WSGI-сервера; доступ к ним идёт под блокировкой файла. Время
+шаблонов считает бэкенд TimedDjangoTemplates.
+
+Слот на каждое имя: имя и массив double — корзины гистограммы времени,
+затем число ответов и суммы из SUMS. Место под имя ищется открытой
+адресацией от crc32 имени; когда слотов не хватает, ответ не учитывается.
+"""
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connections
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates, Template
+
+# Границы корзин гистограммы времени ответа, секунды.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SUMS = ('count', 'seconds', 'queries', 'db_seconds', 'template_seconds',
+        'bytes')
+NAME_SIZE = 120
+MAGIC = b'YTMETR02'
+HEADER = struct.Struct('8sIIIq')
+# Имя ответа, который не сопоставился ни с одним адресом.
+UNRESOLVED = '<unresolved>'
+
+state = threading.local()
+
+
+class MetricsStore:
+    """Слоты «имя — массив double» в общем для процессов файле.
+
+    epoch в заголовке позволяет хранить в файле окно времени: запись
+    с другой эпохой сначала обнуляет все слоты.
+    """
+
+    def __init__(self, path, slots, values, name_size=NAME_SIZE):
+        self.path = path
+        self.slots = slots
+        self.values = values
+        self.name_size = name_size
+        self.slot_size = -(-(name_size + 8 * values) // 8) * 8
+        self.size = HEADER.size + self.slots * self.slot_size
+        self.index = {}
+        self.lock = threading.Lock()
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self.locked():
+            header = os.pread(self.fd, HEADER.size, 0)
+            if (os.fstat(self.fd).st_size != self.size
+                    or header[:HEADER.size - 8] != self.header(0)[:-8]):
+                # Новый файл или другая раскладка: начинаем с нуля.
+                os.ftruncate(self.fd, 0)
+                os.ftruncate(self.fd, self.size)
+                os.pwrite(self.fd, self.header(0), 0)
+        self.map = mmap.mmap(self.fd, self.size)
+
+    def header(self, epoch):
+        return HEADER.pack(
+            MAGIC, self.slots, self.values, self.name_size, epoch
+        )
+
+    @property
+    def epoch(self):
+        return HEADER.unpack_from(self.map)[-1]
+
+    @contextmanager
+    def locked(self):
+        """Блокировка и между потоками процесса, и между процессами."""
+        with self.lock:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def offset(self, slot):
+        return HEADER.size + slot * self.slot_size
+
+    def slot_name(self, slot):
+        offset = self.offset(slot)
+        return self.map[offset:offset + self.name_size].rstrip(b'\0')
+
+    def find_slot(self, encoded):
+        """Номер слота имени; вызывается под блокировкой."""
+        start = zlib.crc32(encoded) % self.slots
+        for step in range(self.slots):
+            slot = (start + step) % self.slots
+            raw = self.slot_name(slot)
+            if raw == encoded:
+                return slot
+            if not raw:
+                offset = self.offset(slot)
+                self.map[offset:offset + len(encoded)] = encoded
+                return slot
+        return None
+
+    def values_view(self, slot):
+        offset = self.offset(slot) + self.name_size
+        return memoryview(self.map)[offset:offset + 8 * self.values].cast('d')
+
+    def update(self, name, apply, epoch=0):
+        """Вызывает apply(values) для слота имени под блокировкой."""
+        with self.locked():
+            if epoch != self.epoch:
+                self.clear(epoch)
+            cached = self.index.get(name)
+            # Кеш процесса устаревает, когда другой процесс чистит файл.
+            if cached is None or self.slot_name(cached[0]) != cached[1]:
+                encoded = name.encode()[:self.name_size]
+                slot = self.find_slot(encoded)
+                if slot is None:
+                    return
+                cached = self.index[name] = (slot, encoded)
+            values = self.values_view(cached[0])
+            try:
+                apply(values)
+            finally:
+                values.release()
+
+    def snapshot(self):
+        """Эпоха и {имя: список значений} для занятых слотов."""
+        result = {}
+        with self.locked():
+            for slot in range(self.slots):
+                name = self.slot_name(slot)
+                if not name:
+                    continue
+                values = self.values_view(slot)
+                result[name.decode('utf-8', 'replace')] = values.tolist()
+                values.release()
+            return self.epoch, result
+
+    def clear(self, epoch=0):
+        """Обнуляет слоты; вызывается под блокировкой."""
+        self.map[:HEADER.size] = self.header(epoch)
+        self.map[HEADER.size:] = bytes(self.size - HEADER.size)
+        self.index.clear()
+
+    def reset(self):
+        with self.locked():
+            self.clear()
+
+
+def record_request(store, name, seconds, queries, db_seconds,
+                   template_seconds, size):
+    def apply(values):
+        for number, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                values[number] += 1
+                break
+        base = len(BUCKETS)
+        values[base] += 1
+        values[base + 1] += seconds
+        values[base + 2] += queries
+        values[base + 3] += db_seconds
+        values[base + 4] += template_seconds
+        values[base + 5] += size
+
+    store.update(name, apply)
+
+
+def request_snapshot(store):
+    """{имя: (корзины без накопления, словарь сумм)}."""
+    _, result = store.snapshot()
+    return {
+        name: (values[:len(BUCKETS)], dict(zip(SUMS, values[len(BUCKETS):])))
+        for name, values in result.items()
+    }
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = MetricsStore(
+            settings.METRICS_FILE,
+            settings.METRICS_SLOTS,
+            len(BUCKETS) + len(SUMS),
+        )
+    return _store
+
+
+@receiver(setting_changed)
+def reset_store(setting, **kwargs):
+    global _store
+    if setting in ('METRICS_FILE', 'METRICS_SLOTS'):
+        _store = None
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def render_metrics(snapshot):
+    """Текстовый формат Prometheus 0.0.4."""
+    lines = [
+        '# HELP yatube_request_duration_seconds Время ответа.',
+        '# TYPE yatube_request_duration_seconds histogram',
+    ]
+    for name, (buckets, sums) in sorted(snapshot.items()):
+        view = _label(name)
+        total = 0
+        for bound, count in zip(BUCKETS, buckets):
+            total += count
+            lines.append(
+                f'yatube_request_duration_seconds_bucket'
+                f'{{view="{view}",le="{bound}"}} {total:.0f}'
+            )
+        lines += [
+            f'yatube_request_duration_seconds_bucket'
+            f'{{view="{view}",le="+Inf"}} {sums["count"]:.0f}',
+            f'yatube_request_duration_seconds_sum{{view="{view}"}} '
+            f'{sums["seconds"]!r}',
+            f'yatube_request_duration_seconds_count{{view="{view}"}} '
+            f'{sums["count"]:.0f}',
+        ]
+    counters = (
+        ('yatube_db_queries_total', 'queries', 'Запросы к базе.'),
+        ('yatube_db_duration_seconds_total', 'db_seconds',
+         'Время запросов к базе.'),
+        ('yatube_template_duration_seconds_total', 'template_seconds',
+         'Время отрисовки шаблонов.'),
+        ('yatube_response_bytes_total', 'bytes',
+         'Размер тел ответов без потоковых.'),
+    )
+    for metric, field, description in counters:
+        lines += [f'# HELP {metric} {description}', f'# TYPE {metric} counter']
+        lines += [
+            f'{metric}{{view="{_label(name)}"}} {sums[field]!r}'
+            for name, (_, sums) in sorted(snapshot.items())
+        ]
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Ставится первым, чтобы время включало остальные middleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def count_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            state.queries += 1
+            state.db_seconds += time.perf_counter() - started
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state.view = request.resolver_match.view_name
+
+    def __call__(self, request):
+        state.view = None
+        state.queries = 0
+        state.db_seconds = 0.0
+        state.template_seconds = 0.0
+        state.depth = 0
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(self.count_query)
+                )
+            response = self.get_response(request)
+        state.view = None
+        seconds = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        record_request(
+            get_store(),
+            match.view_name if match else UNRESOLVED,
+            seconds,
+            state.queries,
+            state.db_seconds,
+            state.template_seconds,
+            0 if response.streaming else len(response.content),
+        )
+        return response
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        # Вложенная отрисовка уже входит во время внешней.
+        depth = getattr(state, 'depth', 0)
+        state.depth = depth + 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            state.depth = depth
+            if not depth and hasattr(state, 'template_seconds'):
+                state.template_seconds += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Бэкенд DjangoTemplates, который замеряет время отрисовки."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
@@ -0,0 +1,171 @@
+"""Журнал медленных запросов к базе.
+
+log_query стоит в connection.execute_wrappers каждого соединения, его
+добавляет CoreConfig.ready через сигнал connection_created. Запрос
+дольше SLOW_QUERY_THRESHOLD пишется в лог yatube.slow_queries с именем
+представления, типами и длинами параметров; сами значения, среди которых
+хеши паролей и ключи сессий, в лог не попадают. Итоги по отпечаткам SQL копятся
+в общих для процессов файлах за два последних окна SLOW_QUERY_WINDOW.
+Медленные запросы учитываются все, остальные — с вероятностью
+SLOW_QUERY_SAMPLE_RATE и весом 1 / SLOW_QUERY_SAMPLE_RATE, поэтому
+обычный запрос стоит двух замеров времени и одного random().
+"""
+import hashlib
+import logging
+import random
+import re
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .metrics import MetricsStore, state
+
+# Подходят и к SQL с подставленными значениями из connection.queries,
+# и к SQL с заполнителями %s, который видит execute_wrapper.
+FINGERPRINT_RULES = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+FIELDS = ('count', 'seconds', 'max_seconds', 'slow')
+# Байт под отпечаток в слоте; длинные укорачиваются с md5 на конце.
+FINGERPRINT_SIZE = 2048
+
+logger = logging.getLogger('yatube.slow_queries')
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """SQL без значений: запросы, отличные только параметрами, совпадут."""
+    for pattern, replacement in FINGERPRINT_RULES:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def store_key(sql_fingerprint):
+    encoded = sql_fingerprint.encode()
+    if len(encoded) <= FINGERPRINT_SIZE:
+        return sql_fingerprint
+    head = encoded[:FINGERPRINT_SIZE - 40].decode('utf-8', 'ignore')
+    return f'{head} … {hashlib.md5(encoded).hexdigest()}'
+
+
+def describe_param(value):
+    if isinstance(value, (str, bytes, bytearray, memoryview)):
+        return f'{type(value).__name__}({len(value)})'
+    return type(value).__name__
+
+
+def sample_params(params, many):
+    """Типы параметров и длины строк, без значений."""
+    if many:
+        params = (
+            params[0] if isinstance(params, (list, tuple)) and params
+            else None
+        )
+    if params is None:
+        return '-'
+    if isinstance(params, dict):
+        text = ', '.join(
+            f'{name}: {describe_param(value)}'
+            for name, value in params.items()
+        )
+    else:
+        text = ', '.join(describe_param(value) for value in params)
+    limit = settings.SLOW_QUERY_PARAMS_CHARS
+    return text if len(text) <= limit else text[:limit] + '…'
+
+
+_stores = None
+
+
+def get_stores():
+    """Файлы чётного и нечётного окна."""
+    global _stores
+    if _stores is None:
+        _stores = [
+            MetricsStore(
+                f'{settings.SLOW_QUERY_FILE}-{parity}',
+                settings.SLOW_QUERY_SLOTS,
+                len(FIELDS),
+                FINGERPRINT_SIZE,
+            )
+            for parity in (0, 1)
+        ]
+    return _stores
+
+
+@receiver(setting_changed)
+def reset_stores(setting, **kwargs):
+    global _stores
+    if setting in ('SLOW_QUERY_FILE', 'SLOW_QUERY_SLOTS'):
+        _stores = None
+
+
+def aggregate(sql_fingerprint, seconds, weight, slow):
+    window = int(time.time() // settings.SLOW_QUERY_WINDOW)
+
+    def apply(values):
+        values[0] += weight
+        values[1] += seconds * weight
+        values[2] = max(values[2], seconds)
+        values[3] += slow
+
+    get_stores()[window % 2].update(
+        store_key(sql_fingerprint), apply, epoch=window
+    )
+
+
+def log_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = time.perf_counter() - started
+        if seconds >= settings.SLOW_QUERY_THRESHOLD:
+            sql_fingerprint = fingerprint(sql)
+            logger.warning(
+                'Медленный запрос %.1f мс в %s: %s; параметры: %s',
+                seconds * 1000,
+                getattr(state, 'view', None) or '-',
+                sql_fingerprint,
+                sample_params(params, many),
+            )
+            aggregate(sql_fingerprint, seconds, 1, True)
+        elif random.random() < settings.SLOW_QUERY_SAMPLE_RATE:
+            aggregate(
+                fingerprint(sql),
+                seconds,
+                1 / settings.SLOW_QUERY_SAMPLE_RATE,
+                False,
+            )
+
+
+def install(sender, connection, **kwargs):
+    if log_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(log_query)
+
+
+def top_fingerprints(limit, order='seconds'):
+    """Отпечатки за текущее и прошлое окно по убыванию поля order."""
+    window = int(time.time() // settings.SLOW_QUERY_WINDOW)
+    totals = {}
+    for store in get_stores():
+        epoch, snapshot = store.snapshot()
+        if epoch < window - 1:
+            continue
+        for key, values in snapshot.items():
+            total = totals.setdefault(key, dict.fromkeys(FIELDS, 0))
+            for field, value in zip(FIELDS, values):
+                if field == 'max_seconds':
+                    total[field] = max(total[field], value)
+                else:
+                    total[field] += value
+    return sorted(
+        totals.items(), key=lambda item: item[1][order], reverse=True
+    )[:limit]
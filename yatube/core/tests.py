@@ -1,4 +1,21 @@
-from django.test import TestCase
+import multiprocessing
+import os
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .metrics import (BUCKETS, UNRESOLVED, MetricsStore, get_store,
+                      record_request, request_snapshot)
+from .slow_queries import (get_stores, log_query, sample_params,
+                           top_fingerprints)
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -6,3 +23,172 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+@override_settings(METRICS_ALLOWED_IPS=['127.0.0.1'])
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.store = get_store()
+        self.store.reset()
+
+    def metric(self, text, line_start):
+        for line in text.splitlines():
+            if line.startswith(line_start):
+                return float(line.rsplit(' ', 1)[1])
+        self.fail(f'Нет строки {line_start}')
+
+    def test_request_recorded(self):
+        """Ответ попадает в гистограмму своего представления."""
+        page = self.client.get(reverse('posts:index'))
+        text = self.client.get(reverse('metrics')).content.decode()
+        view = '{view="posts:index"}'
+        self.assertEqual(self.metric(
+            text, 'yatube_request_duration_seconds_count' + view), 1)
+        self.assertEqual(self.metric(
+            text, 'yatube_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"}'), 1)
+        self.assertGreater(
+            self.metric(text, 'yatube_db_queries_total' + view), 0)
+        self.assertGreater(self.metric(
+            text, 'yatube_template_duration_seconds_total' + view), 0)
+        self.assertEqual(
+            self.metric(text, 'yatube_response_bytes_total' + view),
+            len(page.content),
+        )
+
+    def test_unresolved_request(self):
+        self.client.get('/nonexist-page/')
+        snapshot = request_snapshot(self.store)
+        self.assertEqual(snapshot[UNRESOLVED][1]['count'], 1)
+
+    def test_shared_between_processes(self):
+        """Счётчики, записанные другим процессом, видны в этом."""
+        process = multiprocessing.get_context('fork').Process(
+            target=record_request,
+            args=(
+                MetricsStore(self.store.path, self.store.slots,
+                             self.store.values),
+                'posts:index', 0.02, 3, 0.01, 0.005, 100,
+            ),
+        )
+        process.start()
+        process.join()
+        buckets, sums = request_snapshot(self.store)['posts:index']
+        self.assertEqual(buckets[BUCKETS.index(0.025)], 1)
+        self.assertEqual(sums['queries'], 3)
+        self.assertEqual(sums['bytes'], 100)
+
+    def test_metrics_forbidden_for_others(self):
+        response = Client(REMOTE_ADDR='192.0.2.1').get(reverse('metrics'))
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        client = Client(REMOTE_ADDR='192.0.2.1')
+        for header, status in (('Bearer wrong', 403), ('Bearer secret', 200)):
+            with self.subTest(header=header):
+                response = client.get(
+                    reverse('metrics'), HTTP_AUTHORIZATION=header
+                )
+                self.assertEqual(response.status_code, status)
+
+    def test_store_private(self):
+        self.assertEqual(os.stat(self.store.path).st_mode & 0o777, 0o600)
+
+    def test_store_outside_project(self):
+        """Тесты не пишут в файлы метрик сервера."""
+        for path in (settings.METRICS_FILE, settings.SLOW_QUERY_FILE):
+            with self.subTest(path=path):
+                self.assertFalse(path.startswith(settings.BASE_DIR))
+
+
+class SlowQueryTest(TestCase):
+    def setUp(self):
+        for store in get_stores():
+            store.reset()
+
+    def test_installed_on_connection(self):
+        self.assertIn(log_query, connection.execute_wrappers)
+
+    @override_settings(SLOW_QUERY_SAMPLE_RATE=0)
+    def test_slow_query_logged_with_view(self):
+        """Медленный запрос пишется в лог с представлением и типами."""
+        user = User.objects.create_user('reader')
+        self.client.force_login(user)
+        secrets = ('reader', user.password, self.client.session.session_key)
+        with override_settings(SLOW_QUERY_THRESHOLD=0), \
+                self.assertLogs('yatube.slow_queries', 'WARNING') as logs:
+            self.client.get(reverse('posts:profile', args=[user.username]))
+        self.assertTrue(any(
+            'posts:profile' in line and 'параметры: str(6)' in line
+            for line in logs.output
+        ))
+        for secret in secrets:
+            with self.subTest(secret=secret):
+                self.assertFalse(any(secret in line for line in logs.output))
+        self.assertTrue(
+            all(total['slow'] for _, total in top_fingerprints(100))
+        )
+
+    def test_params_without_values(self):
+        cases = (
+            (('pbkdf2_sha256$1', 5, None), False, 'str(15), int, NoneType'),
+            ([(b'key', 1.5), (b'other', 2)], True, 'bytes(3), float'),
+            ({'session': 'abc'}, False, 'session: str(3)'),
+            ([], True, '-'),
+        )
+        for params, many, expected in cases:
+            with self.subTest(params=params):
+                self.assertEqual(sample_params(params, many), expected)
+
+    @override_settings(SLOW_QUERY_THRESHOLD=60, SLOW_QUERY_SAMPLE_RATE=1)
+    def test_queries_grouped_by_fingerprint(self):
+        for pk in range(3):
+            User.objects.filter(pk=pk).exists()
+        sql, total = top_fingerprints(1, 'count')[0]
+        self.assertIn('WHERE "auth_user"."id" = ? LIMIT ?', sql)
+        self.assertEqual(total['count'], 3)
+        self.assertEqual(total['slow'], 0)
+
+    @override_settings(SLOW_QUERY_THRESHOLD=60, SLOW_QUERY_SAMPLE_RATE=1)
+    def test_old_window_dropped(self):
+        window = int(time.time() // settings.SLOW_QUERY_WINDOW)
+
+        def apply(values):
+            values[0] += 1
+
+        get_stores()[window % 2].update('SELECT ?', apply, epoch=window - 2)
+        self.assertEqual(top_fingerprints(10), [])
+
+    @override_settings(SLOW_QUERY_THRESHOLD=60, SLOW_QUERY_SAMPLE_RATE=1)
+    def test_command_prints_top(self):
+        User.objects.filter(username='nobody').exists()
+        output = StringIO()
+        call_command('slow_queries', stdout=output)
+        self.assertIn('FROM "auth_user" WHERE "auth_user"."username" = ?',
+                      output.getvalue())
+        call_command('slow_queries', '--reset', stdout=output)
+        self.assertEqual(top_fingerprints(10), [])
+
+    def test_overhead(self):
+        """Быстрый запрос вне выборки стоит как пара замеров времени."""
+        def execute(sql, params, many, context):
+            return None
+
+        def timer(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                time.perf_counter() - started
+
+        def timed(wrapper, calls=10000):
+            started = time.perf_counter()
+            for _ in range(calls):
+                wrapper(execute, 'SELECT 1', (), False, {})
+            return time.perf_counter() - started
+
+        # Лучший из повторов меньше зависит от соседей по машине.
+        baseline = min(timed(timer) for _ in range(5))
+        overhead = min(timed(log_query) for _ in range(5))
+        self.assertLess(overhead, baseline * 10)
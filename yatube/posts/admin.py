@@ -1,8 +1,70 @@
+import hashlib
+from functools import partial
+
+from django import forms
 from django.contrib import admin
+from django.core.exceptions import EmptyResultSet
+
+from . import search
 from .models import Post, Group, Comment, Follow
+from .utils import CachedCountPaginator
+
+
+class ChangeListMixin:
+    """Постоянное число запросов на страницу списка в админке.
+
+    Полное число строк без фильтров не считается, а число строк
+    с фильтрами берётся из кеша по тексту запроса. Варианты выбора
+    для внешних ключей в list_editable читаются один раз на страницу,
+    а не в каждой строке.
+    """
+    show_full_result_count = False
+
+    def get_paginator(self, request, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True):
+        try:
+            sql = str(queryset.query)
+        except EmptyResultSet:
+            # Поиск вернул queryset.none(): считать нечего.
+            return super().get_paginator(
+                request, queryset, per_page, orphans, allow_empty_first_page
+            )
+        digest = hashlib.md5(sql.encode()).hexdigest()
+        return CachedCountPaginator(
+            queryset, per_page, count_key=('admin', digest)
+        )
 
+    def formfield_for_changelist(self, db_field, request, **kwargs):
+        # Виджеты автодополнения в строках списка делают запрос на строку,
+        # поэтому здесь поля остаются обычными select с обёрткой админки.
+        if db_field.name in self.get_autocomplete_fields(request):
+            kwargs.setdefault('widget', forms.Select)
+        return self.formfield_for_dbfield(db_field, request, **kwargs)
 
-class PostAdmin(admin.ModelAdmin):
+    def get_changelist_formset(self, request, **kwargs):
+        kwargs.setdefault(
+            'formfield_callback',
+            partial(self.formfield_for_changelist, request=request),
+        )
+        return super().get_changelist_formset(request, **kwargs)
+
+    def get_changelist_form(self, request, **kwargs):
+        form = super().get_changelist_form(request, **kwargs)
+        choices = {}
+
+        class ChangeListForm(form):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                for name, field in self.fields.items():
+                    if hasattr(field, 'queryset'):
+                        if name not in choices:
+                            choices[name] = list(field.choices)
+                        field.choices = choices[name]
+
+        return ChangeListForm
+
+
+class PostAdmin(ChangeListMixin, admin.ModelAdmin):
     list_display = (
         'pk',
         'text',
@@ -11,12 +73,20 @@ class PostAdmin(admin.ModelAdmin):
         'group'
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по тексту идёт через индекс FTS5, а не LIKE по всем строкам.
+        if not search_term:
+            return queryset, False
+        return search.filter_posts(queryset, search_term), False
+
 
-class GroupAdmin(admin.ModelAdmin):
+class GroupAdmin(ChangeListMixin, admin.ModelAdmin):
     list_display = (
         'title',
         'description',
@@ -27,7 +97,7 @@ class GroupAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ChangeListMixin, admin.ModelAdmin):
     list_display = (
         'post',
         'text',
@@ -36,15 +106,19 @@ class CommentAdmin(admin.ModelAdmin):
         'pk',
     )
     list_editable = ('text',)
+    list_select_related = ('post', 'author')
+    autocomplete_fields = ('post', 'author')
     search_fields = ('text',)
     empty_value_display = '-пусто-'
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(ChangeListMixin, admin.ModelAdmin):
     list_display = (
         'user',
         'author',
     )
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
     empty_value_display = '-пусто-'
 
 
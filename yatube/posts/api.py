@@ -0,0 +1,263 @@
+"""JSON API только для чтения.
+
+Ответы собираются из values() без экземпляров моделей. ?fields=
+сужает набор выбираемых столбцов, ?include=authors,comments добавляет
+к странице постов их авторов и последние комментарии, по одному
+запросу на каждое. Списки листаются теми же курсорами ?after=,
+?before= и ?last=, что и HTML-ленты.
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import OuterRef, Subquery
+from django.http import JsonResponse
+from django.views.decorators.http import require_safe
+
+from .models import Comment, Group, Post, User
+from .timeline import timeline_cursor_page
+from .utils import CursorPaginator, get_cursor_page
+
+# Имя поля в ответе -> путь в values().
+POST_FIELDS = {
+    'id': 'pk',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comment_count': 'comment_count',
+}
+COMMENT_FIELDS = {
+    'id': 'pk',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+GROUP_FIELDS = {
+    'id': 'pk',
+    'title': 'title',
+    'slug': 'slug',
+    'description': 'description',
+}
+PROFILE_FIELDS = {
+    'id': 'pk',
+    'username': 'username',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'posts_count': 'profile__posts_count',
+    'followers_count': 'profile__followers_count',
+    'following_count': 'profile__following_count',
+}
+INCLUDES = ('authors', 'comments')
+
+
+def image_url(name):
+    return default_storage.url(name) if name else None
+
+
+CONVERTERS = {'image': image_url}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def api_view(view):
+    """GET-представление API: ApiError превращается в JSON с ошибкой."""
+    @require_safe
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as error:
+            return JsonResponse(
+                {'error': error.message}, status=error.status
+            )
+    return wrapper
+
+
+def requested(request, param, available):
+    """Имена из ?param=a,b; без параметра — все доступные."""
+    value = request.GET.get(param)
+    if not value:
+        return list(available)
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ApiError(400, f'Неизвестные значения {param}: '
+                            + ', '.join(unknown))
+    return names
+
+
+def select(queryset, fields, names, extra=()):
+    """values() только со столбцами полей names и служебными extra."""
+    paths = [fields[name] for name in names]
+    paths += [path for path in extra if path not in paths]
+    return queryset.values(*paths)
+
+
+def serialize(row, fields, names):
+    result = {}
+    for name in names:
+        value = row[fields[name]]
+        convert = CONVERTERS.get(name)
+        result[name] = convert(value) if convert else value
+    return result
+
+
+def get_row(queryset, fields, names, **lookup):
+    row = select(queryset, fields, names).filter(**lookup).first()
+    if row is None:
+        raise ApiError(404, 'Не найдено')
+    return serialize(row, fields, names)
+
+
+def page_response(page, rows, included=None):
+    data = {
+        'results': rows,
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    }
+    if included is not None:
+        data['included'] = included
+    return JsonResponse(data)
+
+
+def latest_comments(post_ids):
+    """Последние COMMENTS_PAGE комментариев каждого поста одним запросом."""
+    latest = Comment.objects.filter(post_id=OuterRef('post_id')).order_by(
+        '-created', '-pk'
+    ).values('pk')[:settings.COMMENTS_PAGE]
+    comments = select(
+        Comment.objects.filter(post_id__in=post_ids, pk__in=Subquery(latest)),
+        COMMENT_FIELDS, list(COMMENT_FIELDS),
+    ).order_by('post_id', '-created', '-pk')
+    names = list(COMMENT_FIELDS)
+    return [serialize(row, COMMENT_FIELDS, names) for row in comments]
+
+
+def include_related(rows, includes):
+    """Связанные данные страницы постов по ?include=."""
+    included = {}
+    if 'authors' in includes:
+        authors = select(
+            User.objects.filter(pk__in={row['author_id'] for row in rows}),
+            PROFILE_FIELDS, list(PROFILE_FIELDS),
+        )
+        names = list(PROFILE_FIELDS)
+        included['authors'] = [
+            serialize(row, PROFILE_FIELDS, names) for row in authors
+        ]
+    if 'comments' in includes:
+        included['comments'] = latest_comments([row['pk'] for row in rows])
+    return included
+
+
+def post_params(request):
+    """Поля, включения и служебные столбцы страницы постов."""
+    names = requested(request, 'fields', POST_FIELDS)
+    includes = (
+        requested(request, 'include', INCLUDES)
+        if request.GET.get('include') else []
+    )
+    extra = ['pk', 'pub_date']
+    if 'authors' in includes:
+        extra.append('author_id')
+    return names, includes, extra
+
+
+def posts_response(page, rows, names, includes):
+    included = include_related(rows, includes) if includes else None
+    return page_response(
+        page, [serialize(row, POST_FIELDS, names) for row in rows], included
+    )
+
+
+@api_view
+def posts(request):
+    """Лента постов, ?group=<slug> и ?author=<username> сужают её."""
+    names, includes, extra = post_params(request)
+    post_list = Post.objects.all()
+    if request.GET.get('group'):
+        post_list = post_list.filter(group__slug=request.GET['group'])
+    if request.GET.get('author'):
+        post_list = post_list.filter(author__username=request.GET['author'])
+    paginator = CursorPaginator(
+        select(post_list, POST_FIELDS, names, extra), settings.PAGINATOR_PAGE
+    )
+    page = get_cursor_page(request, paginator)
+    return posts_response(page, page.object_list, names, includes)
+
+
+@api_view
+def follow(request):
+    """Лента подписок текущего пользователя."""
+    if not request.user.is_authenticated:
+        raise ApiError(401, 'Нужна авторизация')
+    names, includes, extra = post_params(request)
+    page = timeline_cursor_page(request, request.user)
+    post_ids = page.object_list
+    rows = {
+        row['pk']: row for row in select(
+            Post.objects.filter(pk__in=post_ids), POST_FIELDS, names, extra
+        ).order_by()
+    }
+    rows = [rows[pk] for pk in post_ids if pk in rows]
+    return posts_response(page, rows, names, includes)
+
+
+@api_view
+def post_detail(request, post_id):
+    names = requested(request, 'fields', POST_FIELDS)
+    return JsonResponse(
+        get_row(Post.objects.all(), POST_FIELDS, names, pk=post_id)
+    )
+
+
+@api_view
+def post_comments(request, post_id):
+    """Комментарии поста от новых к старым."""
+    names = requested(request, 'fields', COMMENT_FIELDS)
+    comments = select(
+        Comment.objects.filter(post_id=post_id), COMMENT_FIELDS, names,
+        ('pk', 'created'),
+    )
+    paginator = CursorPaginator(
+        comments, settings.COMMENTS_PAGE, key=('created', 'pk')
+    )
+    page = get_cursor_page(request, paginator)
+    return page_response(page, [
+        serialize(row, COMMENT_FIELDS, names) for row in page.object_list
+    ])
+
+
+@api_view
+def groups(request):
+    """Все группы по названию: их немного, и они правятся в админке."""
+    names = requested(request, 'fields', GROUP_FIELDS)
+    group_list = select(Group.objects.all(), GROUP_FIELDS, names)
+    return JsonResponse({'results': [
+        serialize(row, GROUP_FIELDS, names)
+        for row in group_list.order_by('title')
+    ]})
+
+
+@api_view
+def group_detail(request, slug):
+    names = requested(request, 'fields', GROUP_FIELDS)
+    return JsonResponse(
+        get_row(Group.objects.all(), GROUP_FIELDS, names, slug=slug)
+    )
+
+
+@api_view
+def profile(request, username):
+    names = requested(request, 'fields', PROFILE_FIELDS)
+    return JsonResponse(
+        get_row(User.objects.all(), PROFILE_FIELDS, names, username=username)
+    )
@@ -0,0 +1,18 @@
+from django.urls import path
+from . import api
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/', api.posts, name='posts'),
+    path('posts/<int:post_id>/', api.post_detail, name='post_detail'),
+    path(
+        'posts/<int:post_id>/comments/',
+        api.post_comments,
+        name='post_comments',
+    ),
+    path('groups/', api.groups, name='groups'),
+    path('groups/<slug:slug>/', api.group_detail, name='group_detail'),
+    path('profiles/<str:username>/', api.profile, name='profile'),
+    path('follow/', api.follow, name='follow'),
+]
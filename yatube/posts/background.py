@@ -0,0 +1,78 @@
+"""Фоновые задачи после коммита: миниатюры, дозапись лент.
+
+Задачи уходят в общий пул процессов. Процессы запускаются через spawn
+и заново настраивают Django с теми же базами, что у родителя, включая
+тестовые. Базу в памяти процессы пула не видят, поэтому с ней, как и
+при BACKGROUND_WORKERS = 0, задача выполняется в текущем процессе
+сразу после коммита. Пул закрывается при выходе из процесса.
+"""
+import atexit
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import django
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+
+
+def setup_worker(databases):
+    django.setup()
+    for alias, name in databases.items():
+        connections[alias].settings_dict['NAME'] = name
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True)
+        _pool = None
+
+
+def get_pool():
+    """Пул процессов, общий для всего процесса."""
+    global _pool
+    if _pool is None:
+        databases = {
+            alias: connections[alias].settings_dict['NAME']
+            for alias in connections
+        }
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.BACKGROUND_WORKERS,
+            mp_context=get_context('spawn'),
+            initializer=setup_worker,
+            initargs=(databases,),
+        )
+        atexit.register(shutdown_pool)
+    return _pool
+
+
+def runs_inline(using='default'):
+    connection = connections[using]
+    in_memory = getattr(connection, 'is_in_memory_db', lambda: False)()
+    return not settings.BACKGROUND_WORKERS or in_memory
+
+
+def _log_failure(future):
+    error = future.exception()
+    if error is not None:
+        logger.error('Фоновая задача не выполнена', exc_info=error)
+
+
+def submit(function, *args):
+    """После коммита выполняет function(*args) в пуле."""
+    def run():
+        if not runs_inline():
+            get_pool().submit(function, *args).add_done_callback(
+                _log_failure
+            )
+            return
+        try:
+            function(*args)
+        except Exception:
+            logger.exception('Фоновая задача не выполнена')
+    transaction.on_commit(run)
@@ -0,0 +1,62 @@
+"""Бюджеты запросов к базе для именованных адресов.
+
+QUERY_BUDGETS — наибольшее число запросов на один ответ, включая
+сессию и пользователя. posts/tests/test_query_budgets.py открывает
+каждый адрес posts:, api: и users: на наполненной базе и падает, если
+у адреса нет бюджета или бюджет превышен. Бюджет не зависит от числа
+строк на странице: лишний запрос на строку его сразу превысит.
+"""
+from collections import Counter
+
+from core.slow_queries import fingerprint
+
+QUERY_BUDGETS = {
+    # Ленты: сессия, пользователь, страница постов, картинки, счётчики.
+    'posts:index': 4,
+    'posts:group_list': 5,
+    'posts:profile': 6,
+    'posts:follow_index': 6,
+    'posts:search': 2,
+    # RSS и Atom: объект ленты и посты, потом только кеш.
+    'posts:index_rss': 1,
+    'posts:index_atom': 1,
+    'posts:group_rss': 2,
+    'posts:group_atom': 2,
+    'posts:profile_rss': 2,
+    'posts:profile_atom': 2,
+    'posts:post_detail': 7,
+    'posts:post_comments': 3,
+    'posts:post_edit': 5,
+    'posts:post_delete': 12,
+    'posts:create_post': 3,
+    'posts:add_comment': 2,
+    'posts:comment_delete': 8,
+    'posts:export': 4,
+    'posts:profile_follow': 4,
+    'posts:profile_unfollow': 10,
+    # JSON API: одна выборка values() на ответ.
+    'api:posts': 1,
+    'api:post_detail': 1,
+    'api:post_comments': 1,
+    'api:groups': 1,
+    'api:group_detail': 1,
+    'api:profile': 1,
+    'api:follow': 5,
+    'users:signup': 2,
+    'users:login': 2,
+    'users:logout': 4,
+    'users:password_reset_form': 2,
+    'users:password_reset_done': 2,
+    'users:password_change': 2,
+    'users:password_change_done': 2,
+}
+
+
+def budget_report(name, budget, queries):
+    """Текст о превышении бюджета: запросы, сгруппированные по отпечатку."""
+    counts = Counter(fingerprint(query['sql']) for query in queries)
+    lines = [f'{name}: {len(queries)} запросов при бюджете {budget}']
+    lines += [
+        f'  {count} × {sql}' for sql, count in counts.most_common()
+    ]
+    return '\n'.join(lines)
@@ -0,0 +1,67 @@
+"""Версии кеша фрагментов лент.
+
+Версия входит в ключ {% cache %}, и сигналы Post и Group сбрасывают
+фрагменты сменой версии. Карточки постов кешируются отдельно по отметке
+Post.modified, которую сдвигают и правка поста, и новые комментарии.
+
+Те же версии служат валидаторами условного GET: page_etag собирает
+из них ETag страницы без запросов к постам. Версии лежат в общем кеше,
+их видят все процессы. Записи в обход сигналов версию не меняют, поэтому
+она, как и фрагменты, живёт FEED_CACHE_TIMEOUT и затем начинается заново.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _version_key(*parts):
+    return 'feed-version:' + ':'.join(str(part) for part in parts)
+
+
+def feed_version(*parts):
+    key = _version_key(*parts)
+    version = cache.get(key)
+    if version is None:
+        # Начальная версия из времени, чтобы после вытеснения ключа
+        # не совпасть со старыми фрагментами.
+        version = time.time_ns()
+        if not cache.add(key, version, settings.FEED_CACHE_TIMEOUT):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_feed(*parts):
+    # Версия — время смены: от него считает Last-Modified feeds.py.
+    cache.set(
+        _version_key(*parts), time.time_ns(), settings.FEED_CACHE_TIMEOUT
+    )
+
+
+def bump_post_feeds(post):
+    """Сбрасывает ленты поста, и прежние группу и автора тоже."""
+    bump_feed('index')
+    loaded = getattr(post, '_loaded_values', {})
+    for group_id in {post.group_id, loaded.get('group_id')}:
+        if group_id is not None:
+            bump_feed('group', group_id)
+    for author_id in {post.author_id, loaded.get('author_id')}:
+        if author_id is not None:
+            bump_feed('author', author_id)
+
+
+def feed_cache(*parts):
+    """Параметры {% cache %} для ленты: срок жизни и текущая версия."""
+    return {
+        'timeout': settings.FEED_CACHE_TIMEOUT,
+        'version': feed_version(*parts),
+    }
+
+
+def page_etag(request, *parts):
+    """ETag страницы из версий данных, зрителя и параметров запроса."""
+    raw = ':'.join(str(part) for part in (
+        *parts, request.user.pk or 0, request.GET.urlencode()
+    ))
+    return '"%s"' % hashlib.md5(raw.encode()).hexdigest()
@@ -0,0 +1,75 @@
+"""Денормализованные счётчики комментариев, постов и подписок.
+
+Счётчики меняются атомарно выражениями F() при создании и удалении
+строк. Расхождения, например после bulk_create или смены автора поста
+в админке, исправляет команда repair_counters.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Comment, Follow, Post, Profile
+
+
+def bump_profile(user_id, **deltas):
+    """Сдвигает счётчики профиля; профиль создаётся только при росте."""
+    if user_id is None:
+        return
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    profiles = Profile.objects.filter(user_id=user_id, **{
+        f'{field}__gte': -delta
+        for field, delta in deltas.items() if delta < 0
+    })
+    if profiles.update(**updates):
+        return
+    if all(delta > 0 for delta in deltas.values()):
+        Profile.objects.get_or_create(user_id=user_id)
+        profiles.update(**updates)
+
+
+def ensure_profile(user):
+    """Профиль пользователя; недостающий создаётся с настоящими счётчиками.
+
+    Профиля нет, например, у пользователей из loaddata: сигнал
+    пропускает raw-сохранения.
+    """
+    try:
+        return user.profile
+    except Profile.DoesNotExist:
+        pass
+    profile, _ = Profile.objects.get_or_create(user=user, defaults={
+        'posts_count': Post.objects.filter(author=user).count(),
+        'followers_count': Follow.objects.filter(author=user).count(),
+        'following_count': Follow.objects.filter(user=user).count(),
+    })
+    user.profile = profile
+    return profile
+
+
+def bump_comments(post_id, delta):
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comment_count__gte=-delta)
+    # Новая отметка modified сбрасывает кеш карточки поста.
+    posts.update(
+        comment_count=F('comment_count') + delta, modified=timezone.now()
+    )
+
+
+def real_count(model, field, outer='pk'):
+    """Выражение с настоящим числом строк model, ссылающихся на outer."""
+    counts = model.objects.filter(**{field: OuterRef(outer)}).order_by(
+    ).values(field).annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def post_counters():
+    return {'comment_count': real_count(Comment, 'post')}
+
+
+def profile_counters():
+    return {
+        'posts_count': real_count(Post, 'author', 'user_id'),
+        'followers_count': real_count(Follow, 'author', 'user_id'),
+        'following_count': real_count(Follow, 'user', 'user_id'),
+    }
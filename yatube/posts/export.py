@@ -0,0 +1,75 @@
+"""Потоковая выгрузка постов и комментариев пользователя.
+
+Строки читаются из values().iterator(chunk_size=EXPORT_CHUNK_SIZE)
+и сразу превращаются в строки NDJSON или CSV, поэтому память
+не растёт с размером аккаунта. Картинки выгружаются ссылками.
+"""
+import csv
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Comment, Post
+
+FIELDS = ('type', 'id', 'post', 'date', 'group', 'image', 'text')
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def export_rows(user, image_url=default_storage.url):
+    """Сначала посты пользователя, затем его комментарии, по одному."""
+    posts = Post.objects.filter(author=user).order_by('pk').values(
+        'pk', 'pub_date', 'group__slug', 'image', 'text'
+    )
+    for post in posts.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        yield {
+            'type': 'post',
+            'id': post['pk'],
+            'post': None,
+            'date': post['pub_date'],
+            'group': post['group__slug'],
+            'image': image_url(post['image']) if post['image'] else None,
+            'text': post['text'],
+        }
+    comments = Comment.objects.filter(author=user).order_by('pk').values(
+        'pk', 'post_id', 'created', 'text'
+    )
+    for comment in comments.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        yield {
+            'type': 'comment',
+            'id': comment['pk'],
+            'post': comment['post_id'],
+            'date': comment['created'],
+            'group': None,
+            'image': None,
+            'text': comment['text'],
+        }
+
+
+def ndjson_lines(rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(row) + '\n'
+
+
+class Echo:
+    """Файл для csv.writer, который возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.DictWriter(Echo(), FIELDS)
+    yield writer.writeheader()
+    for row in rows:
+        row = dict(row, date=row['date'].isoformat())
+        yield writer.writerow(row)
+
+
+def export_lines(user, export_format, image_url=default_storage.url):
+    lines = ndjson_lines if export_format == 'ndjson' else csv_lines
+    return lines(export_rows(user, image_url))
@@ -0,0 +1,169 @@
+"""RSS- и Atom-ленты сайта, групп и авторов.
+
+Готовый XML лежит в кеше вместе с версиями лент, от которых зависит
+(см. caching.py). Пока версии не сменились, опрос ленты обходится
+без базы: ответ или 304 по ETag и Last-Modified, или XML из кеша.
+Last-Modified — время смены версии, а не дата последнего поста:
+после удаления поста дата последнего уходила бы назад.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.http import http_date
+from django.utils.text import Truncator
+
+from .caching import feed_version
+from .models import Group, Post, User
+
+
+class CachedFeed(Feed):
+    """Лента постов с кешем готового XML и условным GET."""
+
+    def cache_parts(self, obj):
+        """Части ключа версии ленты, которую сбрасывают сигналы постов."""
+        raise NotImplementedError
+
+    def _cache_key(self, *args, **kwargs):
+        raw = repr((args, sorted(kwargs.items())))
+        return 'syndication:{}:{}'.format(
+            type(self).__name__, hashlib.md5(raw.encode()).hexdigest()
+        )
+
+    def _render(self, request, *args, **kwargs):
+        try:
+            obj = self.get_object(request, *args, **kwargs)
+        except ObjectDoesNotExist:
+            raise Http404('Feed object does not exist.')
+        parts = self.cache_parts(obj)
+        # Версия читается до выборки постов: правка во время рендера
+        # сменит её, и этот XML не переживёт следующего запроса.
+        version = feed_version(*parts)
+        feedgen = self.get_feed(obj, request)
+        body = feedgen.writeString('utf-8').encode()
+        return {
+            'parts': parts,
+            'version': version,
+            'body': body,
+            'content_type': feedgen.content_type,
+            'etag': '"%s"' % hashlib.md5(body).hexdigest(),
+            'last_modified': version // 10 ** 9,
+        }
+
+    def __call__(self, request, *args, **kwargs):
+        key = self._cache_key(*args, **kwargs)
+        entry = cache.get(key)
+        if entry is None or feed_version(*entry['parts']) != entry['version']:
+            entry = self._render(request, *args, **kwargs)
+            cache.set(key, entry, settings.FEED_CACHE_TIMEOUT)
+        response = get_conditional_response(
+            request, etag=entry['etag'], last_modified=entry['last_modified']
+        )
+        if response is None:
+            response = HttpResponse(
+                entry['body'], content_type=entry['content_type']
+            )
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['last_modified'])
+        return response
+
+    def item_title(self, item):
+        return Truncator(item.text).words(8)
+
+    def item_description(self, item):
+        return item.text
+
+    def item_link(self, item):
+        return reverse('posts:post_detail', args=(item.pk,))
+
+    def item_author_name(self, item):
+        return item.author.get_full_name() or item.author.username
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+    def item_updateddate(self, item):
+        return item.modified
+
+    def item_categories(self, item):
+        return (item.group.title,) if item.group else ()
+
+
+class LatestPostsFeed(CachedFeed):
+    title = 'Yatube: последние записи'
+    description = 'Новые записи всех авторов'
+
+    def link(self):
+        return reverse('posts:index')
+
+    def cache_parts(self, obj):
+        return ('index',)
+
+    def items(self):
+        return Post.objects.for_feed()[:settings.SYNDICATION_ITEMS]
+
+
+class GroupPostsFeed(CachedFeed):
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def cache_parts(self, group):
+        return ('group', group.pk)
+
+    def title(self, group):
+        return f'Yatube: {group.title}'
+
+    def description(self, group):
+        return group.description
+
+    def link(self, group):
+        return reverse('posts:group_list', args=(group.slug,))
+
+    def items(self, group):
+        return group.posts.for_feed()[:settings.SYNDICATION_ITEMS]
+
+
+class AuthorPostsFeed(CachedFeed):
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def cache_parts(self, author):
+        return ('author', author.pk)
+
+    def title(self, author):
+        return f'Yatube: {author.get_full_name() or author.username}'
+
+    def description(self, author):
+        return f'Записи пользователя {author.username}'
+
+    def link(self, author):
+        return reverse('posts:profile', args=(author.username,))
+
+    def items(self, author):
+        return author.posts.for_feed()[:settings.SYNDICATION_ITEMS]
+
+
+class LatestPostsAtomFeed(LatestPostsFeed):
+    feed_type = Atom1Feed
+    subtitle = LatestPostsFeed.description
+
+
+class GroupPostsAtomFeed(GroupPostsFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, group):
+        return self.description(group)
+
+
+class AuthorPostsAtomFeed(AuthorPostsFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, author):
+        return self.description(author)
@@ -1,5 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+
 from .models import Comment, Post
+from .uploads import check_image, prepare_image
 
 
 class PostForm(forms.ModelForm):
@@ -11,6 +14,13 @@ class PostForm(forms.ModelForm):
             'image',
         )
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if not isinstance(image, UploadedFile):
+            return image
+        check_image(image)
+        return prepare_image(image)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,93 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+
+from posts.models import Post
+from posts.thumbnails import image_formats, picture_variants, pregenerate
+
+# Клиенты: ширина окна в CSS-пикселях и плотность пикселей экрана.
+CLIENTS = (
+    ('телефон', 360, 1),
+    ('телефон 2x', 390, 2),
+    ('ноутбук', 1366, 1),
+    ('retina', 1440, 2),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Считает байты картинок одной страницы ленты: прежняя миниатюра '
+        '960x339 JPEG против варианта, который браузер выберет из '
+        'srcset для телефонов и ноутбуков.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--generate',
+            action='store_true',
+            help='Построить недостающие варианты в текущем процессе.',
+        )
+
+    def handle(self, *args, **options):
+        posts = list(
+            Post.objects.exclude(image='').order_by('-pub_date', '-pk')[
+                :settings.PAGINATOR_PAGE
+            ]
+        )
+        if not posts:
+            self.stdout.write('Нет постов с картинками.')
+            return
+        if options['generate']:
+            for post in posts:
+                pregenerate(post.image.name)
+        variants = picture_variants()
+        best = image_formats()[0]
+        legacy = ('JPEG', settings.POST_IMAGE_SIZE[0])
+        sizes = [self.sizes(post, variants) for post in posts]
+        missing = sum(len(variants) - len(size) for size in sizes)
+        if missing:
+            self.stdout.write(
+                f'Не построено вариантов: {missing}, запустите с --generate'
+            )
+            return
+        self.stdout.write(
+            f'Постов на странице: {len(posts)}, формат srcset: {best}'
+        )
+        self.stdout.write(
+            f'{"клиент":<10}{"ширина":>8}{"было, КБ":>10}'
+            f'{"стало, КБ":>11}{"экономия":>10}'
+        )
+        for name, viewport, density in CLIENTS:
+            needed = min(viewport, settings.POST_IMAGE_SIZE[0]) * density
+            chosen = self.choose(variants, best, needed)
+            before = sum(size[legacy] for size in sizes)
+            after = sum(size[chosen.format, chosen.width] for size in sizes)
+            saving = f'{1 - after / before:.0%}'
+            self.stdout.write(
+                f'{name:<10}{chosen.width:>8}{before / 1024:>10.1f}'
+                f'{after / 1024:>11.1f}{saving:>10}'
+            )
+
+    def sizes(self, post, variants):
+        """Размеры готовых вариантов в байтах по (формат, ширина)."""
+        sizes = {}
+        for variant in variants:
+            thumbnail = default.backend.get_thumbnail(
+                post.image, variant.geometry, **variant.options
+            )
+            if thumbnail.name != post.image.name:
+                sizes[variant.format, variant.width] = (
+                    thumbnail.storage.size(thumbnail.name)
+                )
+        return sizes
+
+    def choose(self, variants, format_, needed):
+        """Вариант, который браузер возьмёт из srcset: не уже нужного."""
+        candidates = sorted(
+            (variant for variant in variants if variant.format == format_),
+            key=lambda variant: variant.width,
+        )
+        for variant in candidates:
+            if variant.width >= needed:
+                return variant
+        return candidates[-1]
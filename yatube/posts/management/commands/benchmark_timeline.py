@@ -0,0 +1,141 @@
+import random
+from itertools import chain
+import statistics
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from posts.counters import profile_counters
+from posts.models import Follow, Post, Profile, TimelineEntry
+from posts.views import follow_index
+
+User = get_user_model()
+
+LOCAL_CACHE = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark-timeline',
+    }
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает раскладку при записи и гибридную ленту подписок: '
+        'записи в ленты на пост и задержку чтения /follow/ для '
+        'равномерного и Zipf-распределения подписчиков. '
+        'Все данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=2000)
+        parser.add_argument('--authors', type=int, default=50)
+        parser.add_argument('--follows-per-reader', type=int, default=10)
+        parser.add_argument('--posts-per-author', type=int, default=5)
+        parser.add_argument('--threshold', type=int, default=200)
+        parser.add_argument('--samples', type=int, default=50)
+        parser.add_argument('--zipf-exponent', type=float, default=1.1)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.stdout.write(
+            f'{"распределение":<14}{"режим":<8}{"постов":>8}'
+            f'{"записей":>10}{"на пост":>9}{"запись, с":>11}'
+            f'{"p50, мс":>9}{"p95, мс":>9}'
+        )
+        for distribution in ('uniform', 'zipf'):
+            for mode, threshold in (
+                ('push', sys.maxsize),
+                ('hybrid', options['threshold']),
+            ):
+                result = self.run(distribution, threshold)
+                self.stdout.write(
+                    f'{distribution:<14}{mode:<8}{result["posts"]:>8}'
+                    f'{result["rows"]:>10}{result["per_post"]:>9.1f}'
+                    f'{result["write"]:>11.2f}'
+                    f'{result["p50"]:>9.1f}{result["p95"]:>9.1f}'
+                )
+
+    def weights(self, distribution):
+        authors = self.options['authors']
+        if distribution == 'uniform':
+            return [1] * authors
+        exponent = self.options['zipf_exponent']
+        return [1 / rank ** exponent for rank in range(1, authors + 1)]
+
+    def run(self, distribution, threshold):
+        options = self.options
+        rng = random.Random(options['seed'])
+        with override_settings(
+            CACHES=LOCAL_CACHE, TIMELINE_FANOUT_THRESHOLD=threshold
+        ), transaction.atomic():
+            cache.clear()
+            User.objects.bulk_create(
+                User(username=f'bench-author-{number}')
+                for number in range(options['authors'])
+            )
+            User.objects.bulk_create(
+                User(username=f'bench-reader-{number}')
+                for number in range(options['readers'])
+            )
+            authors = list(User.objects.filter(
+                username__startswith='bench-author-'
+            ).order_by('pk'))
+            readers = list(User.objects.filter(
+                username__startswith='bench-reader-'
+            ))
+            weights = self.weights(distribution)
+            follows = []
+            for reader in readers:
+                followed = set(rng.choices(
+                    authors, weights, k=options['follows_per_reader']
+                ))
+                follows.extend(
+                    Follow(user=reader, author=author) for author in followed
+                )
+            Follow.objects.bulk_create(follows)
+            Profile.objects.bulk_create(
+                Profile(user=user) for user in chain(authors, readers)
+            )
+            Profile.objects.filter(
+                user__username__startswith='bench-'
+            ).update(**profile_counters())
+
+            entries_before = TimelineEntry.objects.count()
+            started = time.perf_counter()
+            posts = 0
+            for author in authors:
+                for number in range(options['posts_per_author']):
+                    Post.objects.create(author=author, text=f'Пост {number}')
+                    posts += 1
+            write = time.perf_counter() - started
+            rows = TimelineEntry.objects.count() - entries_before
+
+            factory = RequestFactory()
+            latencies = []
+            for reader in rng.sample(
+                readers, min(options['samples'], len(readers))
+            ):
+                request = factory.get(reverse('posts:follow_index'))
+                request.user = reader
+                started = time.perf_counter()
+                follow_index(request)
+                latencies.append((time.perf_counter() - started) * 1000)
+            transaction.set_rollback(True)
+        latencies.sort()
+        return {
+            'posts': posts,
+            'rows': rows,
+            'per_post': rows / posts,
+            'write': write,
+            'p50': statistics.median(latencies),
+            'p95': latencies[int(len(latencies) * 0.95) - 1],
+        }
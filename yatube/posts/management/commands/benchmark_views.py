@@ -0,0 +1,191 @@
+import json
+import statistics
+import time
+import tracemalloc
+from importlib import import_module
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Comment, Group, Post, User
+
+URLCONFS = (
+    ('posts', 'posts.urls'),
+    ('api', 'posts.api_urls'),
+    ('users', 'users.urls'),
+)
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, round(share * (len(values) - 1)))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет каждый адрес posts/urls.py, posts/api_urls.py и '
+        'users/urls.py на текущей базе: перцентили задержки, число '
+        'запросов и пик памяти. Результат пишется в JSON и сравнивается '
+        'с базовым замером. Изменения в базе от запросов откатываются. '
+        'Данные для замера создаёт seed_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument(
+            '--baseline', help='JSON прошлого замера для сравнения.'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Допустимый рост p95 и пика памяти, доля.',
+        )
+        parser.add_argument(
+            '--cold',
+            action='store_true',
+            help='Очищать кеш перед каждым запросом.',
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        sample = self.sample_objects()
+        # Адрес вне INTERNAL_IPS: debug toolbar не искажает замер.
+        client = Client(REMOTE_ADDR='192.0.2.1')
+        self.stdout.write(
+            f'{"адрес":<28}{"код":>5}{"p50, мс":>9}{"p95, мс":>9}'
+            f'{"p99, мс":>9}{"запросов":>10}{"память, КБ":>12}'
+        )
+        results = {}
+        for namespace, urlconf in URLCONFS:
+            for pattern in import_module(urlconf).urlpatterns:
+                name = f'{namespace}:{pattern.name}'
+                kwargs = {key: sample.get(key)
+                          for key in pattern.pattern.converters}
+                if None in kwargs.values():
+                    self.stdout.write(f'{name:<28}пропущен: нет данных')
+                    continue
+                result = self.measure(
+                    client, reverse(name, kwargs=kwargs), sample['user']
+                )
+                results[name] = result
+                self.stdout.write(
+                    f'{name:<28}{result["status"]:>5}{result["p50"]:>9.1f}'
+                    f'{result["p95"]:>9.1f}{result["p99"]:>9.1f}'
+                    f'{result["queries"]:>10}{result["peak_kb"]:>12.0f}'
+                )
+        report = {
+            'meta': {
+                'date': timezone.now().isoformat(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'users': User.objects.count(),
+                'samples': options['samples'],
+                'cold': options['cold'],
+            },
+            'results': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результат записан в {options["output"]}')
+        if options['baseline']:
+            self.compare(results, options['baseline'])
+
+    def sample_objects(self):
+        """Самые нагруженные объекты базы для параметров адресов."""
+        post = Post.objects.select_related('author', 'group').order_by(
+            '-comment_count', '-pk'
+        ).first()
+        if post is None:
+            raise CommandError('В базе нет постов, запустите seed_data.')
+        popular = User.objects.exclude(pk=post.author_id).order_by(
+            '-profile__followers_count'
+        ).first() or post.author
+        group = post.group or Group.objects.first()
+        comment = post.comments.order_by('pk').first()
+        # Вход под автором поста: доступны правка и удаление.
+        return {
+            'user': post.author,
+            'post_id': post.pk,
+            'username': popular.username,
+            'slug': group.slug if group else None,
+            'comment_id': comment.pk if comment else None,
+        }
+
+    def request(self, client, url):
+        """Запрос с чтением всего ответа; изменения в базе откатываются."""
+        # Журнал запросов ограничен 9000 строк: после тяжёлого запроса
+        # CaptureQueriesContext перестал бы видеть новые.
+        reset_queries()
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = client.get(url)
+                if response.streaming:
+                    for _ in response.streaming_content:
+                        pass
+                elapsed = (time.perf_counter() - started) * 1000
+            transaction.set_rollback(True)
+        return response, elapsed, len(queries)
+
+    def measure(self, client, url, user):
+        latencies, query_counts = [], []
+        for number in range(self.options['warmup'] + self.options['samples']):
+            # Выход из аккаунта тоже замеряется, поэтому вход повторяется.
+            if '_auth_user_id' not in client.session:
+                client.force_login(user)
+            if self.options['cold']:
+                cache.clear()
+            response, elapsed, queries = self.request(client, url)
+            if number >= self.options['warmup']:
+                latencies.append(elapsed)
+                query_counts.append(queries)
+        if '_auth_user_id' not in client.session:
+            client.force_login(user)
+        tracemalloc.start()
+        self.request(client, url)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {
+            'url': url,
+            'status': response.status_code,
+            'p50': statistics.median(latencies),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+            'queries': max(query_counts),
+            'peak_kb': peak / 1024,
+        }
+
+    def compare(self, results, path):
+        with open(path, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        growth = 1 + self.options['tolerance']
+        regressions = []
+        for name, result in results.items():
+            base = baseline.get(name)
+            if base is None:
+                continue
+            if result['p95'] > base['p95'] * growth:
+                regressions.append(
+                    f'{name}: p95 {base["p95"]:.1f} -> {result["p95"]:.1f} мс'
+                )
+            if result['queries'] > base['queries']:
+                regressions.append(
+                    f'{name}: запросов {base["queries"]} -> '
+                    f'{result["queries"]}'
+                )
+            if result['peak_kb'] > base['peak_kb'] * growth:
+                regressions.append(
+                    f'{name}: память {base["peak_kb"]:.0f} -> '
+                    f'{result["peak_kb"]:.0f} КБ'
+                )
+        if regressions:
+            for line in regressions:
+                self.stderr.write(line)
+            raise CommandError(f'Регрессий: {len(regressions)}')
+        self.stdout.write(f'Регрессий относительно {path} нет')
@@ -0,0 +1,321 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+from urllib.parse import unquote, urlparse
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import search, timeline
+from posts.caching import bump_feed
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Столько значений SQLite принимает в одном IN (...).
+LOOKUP_CHUNK = 500
+# Сколько раз пачка занимает id заново, если их уже взял сайт.
+RESERVE_ATTEMPTS = 5
+
+
+@contextmanager
+def keep_dates(*fields):
+    """Отключает auto_now_add, чтобы bulk_create сохранил даты из файла."""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field, _ in saved:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in saved:
+            field.auto_now_add = value
+
+
+def parse_date(value):
+    date = parse_datetime(value) if value else None
+    if date is None:
+        return timezone.now()
+    if timezone.is_naive(date):
+        return timezone.make_aware(date)
+    return date
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты, комментарии и подписки из NDJSON пачками '
+        'bulk_create. Строки вида {"type": "post", "id", "author", '
+        '"group", "date", "text", "image"}, {"type": "comment", "id", '
+        '"post", "author", "date", "text"} и {"type": "follow", "user", '
+        '"author"}. id постов назначает база, соответствие id из файла '
+        'хранится в контрольной точке, поэтому прерванный импорт можно '
+        'продолжить. Комментарий идёт в файле после своего поста, '
+        'комментарии к постам не из файла пропускаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл NDJSON.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--images-dir',
+            default='.',
+            help='Каталог, от которого отсчитываются пути картинок; '
+                 'ссылки из export_posts — от MEDIA_ROOT.',
+        )
+        parser.add_argument('--image-workers', type=int, default=4)
+        parser.add_argument(
+            '--author',
+            help='Автор строк без поля author, например из export_posts.',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки, по умолчанию <path>.checkpoint.',
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.users = {}
+        self.groups = {}
+        checkpoint = options['checkpoint'] or options['path'] + '.checkpoint'
+        state = self.load_checkpoint(checkpoint)
+        self.touched_groups = set(state.setdefault('groups', []))
+        self.touched_authors = set(state.setdefault('authors', []))
+        # id из файла -> id в базе для постов этого импорта.
+        self.post_map = {
+            int(file_id): pk
+            for file_id, pk in state.setdefault('posts', {}).items()
+        }
+        self.orphans = 0
+        started = time.monotonic()
+        imported = 0
+        with open(options['path'], encoding='utf-8') as source, \
+                ThreadPoolExecutor(options['image_workers']) as pool, \
+                keep_dates(Post._meta.get_field('pub_date'),
+                           Comment._meta.get_field('created')):
+            lines = islice(source, state['line'], None)
+            while True:
+                batch = list(islice(lines, options['batch_size']))
+                if not batch:
+                    break
+                rows = self.parse(batch, state['line'])
+                self.import_batch(rows, pool)
+                state['line'] += len(batch)
+                state['groups'] = sorted(self.touched_groups)
+                state['authors'] = sorted(self.touched_authors)
+                state['posts'] = {
+                    str(file_id): pk for file_id, pk in self.post_map.items()
+                }
+                self.save_checkpoint(checkpoint, state)
+                imported += len(batch)
+                rate = imported / max(time.monotonic() - started, 1e-6)
+                self.stdout.write(
+                    f'Строк: {state["line"]}, {rate:.0f} строк/с'
+                )
+        self.finish()
+
+    def load_checkpoint(self, path):
+        if os.path.exists(path):
+            with open(path) as checkpoint:
+                return json.load(checkpoint)
+        return {'line': 0}
+
+    def save_checkpoint(self, path, state):
+        with open(path + '.tmp', 'w') as checkpoint:
+            json.dump(state, checkpoint)
+        os.replace(path + '.tmp', path)
+
+    def parse(self, lines, first_line):
+        rows = []
+        for number, line in enumerate(lines, first_line + 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                raise CommandError(f'Строка {number}: {error}')
+            if row.get('type') not in ('post', 'comment', 'follow'):
+                raise CommandError(f'Строка {number}: неизвестный type')
+            if row['type'] != 'follow':
+                row.setdefault('author', self.options['author'])
+                if not row['author']:
+                    raise CommandError(f'Строка {number}: нет author')
+            if row['type'] == 'post' and 'id' not in row:
+                raise CommandError(f'Строка {number}: у поста нет id')
+            rows.append(row)
+        return rows
+
+    def resolve(self, cache, queryset, field, names, create):
+        """Дополняет кеш name -> pk, создавая недостающие объекты."""
+        missing = list({name for name in names if name not in cache})
+        for start in range(0, len(missing), LOOKUP_CHUNK):
+            chunk = missing[start:start + LOOKUP_CHUNK]
+            cache.update(queryset.filter(
+                **{f'{field}__in': chunk}
+            ).values_list(field, 'pk'))
+        for name in missing:
+            if name not in cache:
+                cache[name] = create(name).pk
+
+    def image_source(self, path):
+        """Файл картинки в --images-dir.
+
+        export_posts выгружает картинки ссылками от MEDIA_URL, их путь
+        отсчитывается от каталога с копией MEDIA_ROOT.
+        """
+        url_path = urlparse(path).path
+        media = urlparse(settings.MEDIA_URL).path
+        if media != '/' and url_path.startswith(media):
+            path = unquote(url_path[len(media):])
+        return os.path.join(self.options['images_dir'], path.lstrip('/'))
+
+    def copy_image(self, path):
+        """Копирует картинку поста в posts/ под свободным именем."""
+        if not path:
+            return ''
+        name = f'posts/{os.path.basename(path)}'
+        try:
+            with open(self.image_source(path), 'rb') as image:
+                return default_storage.save(name, File(image))
+        except OSError as error:
+            self.stderr.write(f'Картинка {path}: {error}')
+            return ''
+
+    def new_posts(self, post_rows, pool):
+        """Посты, которых ещё не было в файле, с копиями картинок."""
+        fresh = {}
+        for row in post_rows:
+            if row['id'] in self.post_map or row['id'] in fresh:
+                self.stderr.write(f'Пост {row["id"]} уже загружен, пропущен')
+                continue
+            fresh[row['id']] = row
+        images = pool.map(
+            self.copy_image, [row.get('image') for row in fresh.values()]
+        )
+        return {
+            file_id: Post(
+                author_id=self.users[row['author']],
+                group_id=self.groups.get(row.get('group')),
+                text=row['text'],
+                pub_date=parse_date(row.get('date')),
+                image=image,
+            )
+            for (file_id, row), image in zip(fresh.items(), images)
+        }
+
+    def known_post(self, row, batch):
+        if row.get('post') in self.post_map or row.get('post') in batch:
+            return True
+        self.orphans += 1
+        self.stderr.write(
+            f'Комментарий {row.get("id")}: поста {row.get("post")} '
+            f'нет в файле, пропущен'
+        )
+        return False
+
+    def save_batch(self, posts, comment_rows, follows):
+        """Пишет пачку одной транзакцией; IntegrityError — id заняты.
+
+        id постов занимаются подряд после наибольшего в базе. Пост,
+        который сайт сохранил между чтением максимума и вставкой, даёт
+        конфликт ключа, и пачка откатывается целиком, а не теряет пост.
+        """
+        with transaction.atomic():
+            first = (Post.objects.aggregate(max=Max('pk'))['max'] or 0) + 1
+            for pk, post in enumerate(posts.values(), first):
+                post.pk = pk
+            Post.objects.bulk_create(posts.values())
+            post_map = dict(self.post_map)
+            post_map.update(
+                (file_id, post.pk) for file_id, post in posts.items()
+            )
+            Comment.objects.bulk_create(
+                Comment(
+                    post_id=post_map[row['post']],
+                    author_id=self.users[row['author']],
+                    text=row['text'],
+                    created=parse_date(row.get('date')),
+                )
+                for row in comment_rows
+            )
+            Follow.objects.bulk_create(follows, ignore_conflicts=True)
+            # bulk_create не шлёт сигналов: индекс и ленты пишутся здесь.
+            search.index_posts(
+                [(post.pk, post.text) for post in posts.values()]
+            )
+            timeline.fan_out_many(list(posts.values()))
+            for follow in follows:
+                timeline.backfill(follow)
+
+    def import_batch(self, rows, pool):
+        post_rows = [row for row in rows if row['type'] == 'post']
+        follow_rows = [row for row in rows if row['type'] == 'follow']
+        self.resolve(
+            self.users, User.objects.all(), 'username',
+            [row['author'] for row in rows]
+            + [row['user'] for row in follow_rows],
+            lambda username: User.objects.create_user(username),
+        )
+        self.resolve(
+            self.groups, Group.objects.all(), 'slug',
+            [row['group'] for row in post_rows if row.get('group')],
+            lambda slug: Group.objects.create(title=slug, slug=slug),
+        )
+        posts = self.new_posts(post_rows, pool)
+        comment_rows = [
+            row for row in rows
+            if row['type'] == 'comment' and self.known_post(row, posts)
+        ]
+        follows = [
+            Follow(
+                user_id=self.users[row['user']],
+                author_id=self.users[row['author']],
+            )
+            for row in follow_rows
+        ]
+        for _ in range(RESERVE_ATTEMPTS):
+            try:
+                self.save_batch(posts, comment_rows, follows)
+                break
+            except IntegrityError as error:
+                conflict = error
+        else:
+            raise CommandError(f'Не удалось занять id постов: {conflict}')
+        self.post_map.update(
+            (file_id, post.pk) for file_id, post in posts.items()
+        )
+        self.touched_groups.update(
+            post.group_id for post in posts.values() if post.group_id
+        )
+        self.touched_authors.update(post.author_id for post in posts.values())
+
+    def finish(self):
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), [Post, Comment]
+            ):
+                cursor.execute(sql)
+        bump_feed('index')
+        for group_id in self.touched_groups:
+            bump_feed('group', group_id)
+        for author_id in self.touched_authors:
+            bump_feed('author', author_id)
+        call_command('repair_counters', stdout=self.stdout)
+        if self.orphans:
+            self.stdout.write(
+                f'Пропущено комментариев без поста в файле: {self.orphans}'
+            )
+        self.stdout.write(
+            'Импорт завершён. Миниатюры картинок строит '
+            'regenerate_thumbnails.'
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = (
+        'Заново заполняет поисковый индекс FTS5 из таблицы постов. '
+        'Нужна после загрузки постов в обход сигналов (bulk_create).'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            search.rebuild()
+        self.stdout.write('Поисковый индекс перестроен.')
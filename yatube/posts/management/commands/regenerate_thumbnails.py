@@ -0,0 +1,64 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts.models import Post
+from posts.thumbnails import pregenerate
+
+
+def regenerate(name):
+    """Строит миниатюры в процессе пула; ошибку возвращает текстом."""
+    try:
+        pregenerate(name)
+    except Exception as error:
+        return name, str(error)
+    return name, None
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит миниатюры всех картинок постов в пуле процессов. '
+        'Нужна после изменения настроек POST_IMAGE_*.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.THUMBNAIL_WORKERS
+        )
+        parser.add_argument('--chunk-size', type=int, default=20)
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Сначала удалить старые миниатюры каждой картинки.',
+        )
+
+    def handle(self, *args, **options):
+        names = Post.objects.exclude(image='').values_list(
+            'image', flat=True
+        ).distinct().order_by()
+        if options['force']:
+            for name in names.iterator():
+                default.kvstore.delete_thumbnails(ImageFile(name))
+        done = failed = 0
+        with ProcessPoolExecutor(
+            max_workers=options['workers'],
+            mp_context=get_context('spawn'),
+            initializer=django.setup,
+        ) as pool:
+            results = pool.map(
+                regenerate,
+                names.iterator(),
+                chunksize=options['chunk_size'],
+            )
+            for name, error in results:
+                if error is None:
+                    done += 1
+                else:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+        self.stdout.write(f'Миниатюры построены: {done}, ошибок {failed}')
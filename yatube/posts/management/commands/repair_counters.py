@@ -0,0 +1,81 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import timeline
+from posts.counters import post_counters, profile_counters
+from posts.models import Post, Profile
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет счётчики комментариев, постов и подписок с настоящими '
+        'значениями и исправляет расхождения пачками. Затем дописывает '
+        'ленты подписчиков авторов, опустившихся до порога раскладки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, ничего не меняя.',
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+        created = self.create_missing_profiles()
+        posts = self.repair(Post.objects.all(), post_counters)
+        profiles = self.repair(Profile.objects.all(), profile_counters)
+        verb = 'Найдено' if self.dry_run else 'Исправлено'
+        self.stdout.write(
+            f'{verb}: профилей создано {created}, постов {posts}, '
+            f'профилей {profiles}'
+        )
+        if not self.dry_run:
+            resumed = timeline.resume_cooled_authors()
+            self.stdout.write(f'Лент авторов дописано: {resumed}')
+
+    def create_missing_profiles(self):
+        users = User.objects.filter(profile__isnull=True).values_list(
+            'pk', flat=True
+        )
+        if self.dry_run:
+            return users.count()
+        created = 0
+        while True:
+            batch = list(users[:self.batch_size])
+            if not batch:
+                return created
+            created += len(batch)
+            Profile.objects.bulk_create(
+                Profile(user_id=pk) for pk in batch
+            )
+
+    def repair(self, queryset, counters):
+        """Проходит таблицу по pk пачками и пересчитывает разошедшиеся."""
+        fields = list(counters())
+        real = {f'real_{field}': expression
+                for field, expression in counters().items()}
+        last_pk = 0
+        fixed = 0
+        while True:
+            rows = list(
+                queryset.filter(pk__gt=last_pk).order_by('pk').annotate(
+                    **real
+                ).values('pk', *fields, *real)[:self.batch_size]
+            )
+            if not rows:
+                return fixed
+            last_pk = rows[-1]['pk']
+            drifted = [
+                row['pk'] for row in rows
+                if any(row[field] != row[f'real_{field}'] for field in fields)
+            ]
+            fixed += len(drifted)
+            if drifted and not self.dry_run:
+                with transaction.atomic():
+                    queryset.filter(pk__in=drifted).update(**counters())
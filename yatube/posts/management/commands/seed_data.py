@@ -0,0 +1,172 @@
+import itertools
+import json
+import os
+import random
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from PIL import Image
+
+# Размеры исходных картинок: телефонные снимки, скриншоты, квадраты.
+IMAGE_SIZES = ((1600, 1200), (1200, 1600), (1920, 1080), (1080, 1080))
+WEEK = 7 * 24 * 60 * 60
+# Словарь для текстов постов и комментариев.
+WORDS = (
+    'кот', 'собака', 'город', 'река', 'утро', 'вечер', 'поезд', 'книга',
+    'чай', 'море', 'дождь', 'солнце', 'работа', 'отпуск', 'друг', 'музыка',
+    'фильм', 'дом', 'сад', 'лес', 'гора', 'снег', 'лето', 'зима', 'код',
+    'идея', 'вопрос', 'ответ', 'новость', 'история', 'путь', 'мост',
+    'очень', 'сегодня', 'вчера', 'опять', 'наконец', 'красивый', 'новый',
+    'старый', 'большой', 'тихий', 'смешной', 'видел', 'читал', 'писал',
+)
+
+
+def zipf_weights(count, exponent):
+    """Накопленные веса Zipf: первый ранг самый популярный."""
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)
+    ))
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт синтетические данные для нагрузочных замеров: '
+        'пользователей, группы, посты, комментарии, подписки и картинки. '
+        'Активность авторов, популярность постов и подписки распределены '
+        'по Zipf. Данные пишутся в NDJSON и загружаются import_posts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=30000)
+        parser.add_argument('--follows-per-user', type=int, default=20)
+        parser.add_argument(
+            '--images', type=int, default=20,
+            help='Сколько разных картинок сгенерировать.',
+        )
+        parser.add_argument(
+            '--image-share', type=float, default=0.2,
+            help='Доля постов с картинкой.',
+        )
+        parser.add_argument('--zipf-exponent', type=float, default=1.1)
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        directory = tempfile.mkdtemp()
+        try:
+            images = self.make_images(directory)
+            path = os.path.join(directory, 'seed.ndjson')
+            with open(path, 'w', encoding='utf-8') as output:
+                for row in self.rows(images):
+                    output.write(json.dumps(row, ensure_ascii=False) + '\n')
+            call_command(
+                'import_posts', path,
+                f'--batch-size={options["batch_size"]}',
+                f'--images-dir={directory}',
+                stdout=self.stdout,
+                stderr=self.stderr,
+            )
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def make_images(self, directory):
+        names = []
+        for number in range(self.options['images']):
+            size = self.rng.choice(IMAGE_SIZES)
+            # Шум сжимается хуже заливки и ближе к фотографии по весу.
+            image = Image.effect_noise(size, self.rng.randint(20, 80))
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            image = Image.merge('RGB', [
+                image.point(lambda value, shift=shift: (value + shift) % 256)
+                for shift in color
+            ])
+            name = f'seed-{number}.jpg'
+            image.save(os.path.join(directory, name), 'JPEG', quality=85)
+            names.append(name)
+        return names
+
+    def pick(self, cum_weights, count):
+        """count индексов по Zipf с накопленными весами cum_weights."""
+        return self.rng.choices(
+            range(len(cum_weights)), cum_weights=cum_weights, k=count
+        )
+
+    def rows(self, images):
+        options = self.options
+        rng = self.rng
+        exponent = options['zipf_exponent']
+        users = [f'seed-user-{number}' for number in range(options['users'])]
+        groups = [f'seed-group-{number}'
+                  for number in range(options['groups'])]
+        user_weights = zipf_weights(len(users), exponent)
+
+        # Подписки: каждый читает follows_per_user популярных авторов.
+        for number, user in enumerate(users):
+            followed = set(self.pick(
+                user_weights, options['follows_per_user']
+            ))
+            for author in followed:
+                if author != number:
+                    yield {
+                        'type': 'follow', 'user': user,
+                        'author': users[author],
+                    }
+
+        now = timezone.now()
+        span = timedelta(days=options['days']).total_seconds()
+        group_weights = zipf_weights(len(groups), exponent)
+        authors = self.pick(user_weights, options['posts'])
+        post_dates = sorted(
+            now - timedelta(seconds=rng.random() * span)
+            for _ in range(options['posts'])
+        )
+        for post_id, (author, date) in enumerate(
+            zip(authors, post_dates), 1
+        ):
+            row = {
+                'type': 'post', 'id': post_id, 'author': users[author],
+                'date': date.isoformat(),
+                'text': self.text(rng.randint(5, 120)),
+            }
+            if groups and rng.random() < 0.5:
+                row['group'] = groups[self.pick(group_weights, 1)[0]]
+            if images and rng.random() < options['image_share']:
+                row['image'] = rng.choice(images)
+            yield row
+
+        # Популярность постов не связана с их id: ранги перемешаны.
+        if not options['posts']:
+            return
+        ranks = list(range(1, options['posts'] + 1))
+        rng.shuffle(ranks)
+        post_weights = zipf_weights(options['posts'], exponent)
+        for comment_id, rank in enumerate(
+            self.pick(post_weights, options['comments']), 1
+        ):
+            post_id = ranks[rank]
+            post_date = post_dates[post_id - 1]
+            # Комментарии приходят в первую неделю после поста.
+            delay = rng.random() * min(
+                (now - post_date).total_seconds(), WEEK
+            )
+            yield {
+                'type': 'comment', 'id': comment_id, 'post': post_id,
+                'author': users[self.pick(user_weights, 1)[0]],
+                'date': (post_date + timedelta(seconds=delay)).isoformat(),
+                'text': self.text(rng.randint(2, 30)),
+            }
+
+    def text(self, words):
+        return ' '.join(
+            self.rng.choice(WORDS) for _ in range(words)
+        ).capitalize()
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def pause_hot_authors(apps, schema_editor):
+    # Посты авторов выше порога могли публиковаться без раскладки.
+    Profile = apps.get_model('posts', 'Profile')
+    Profile.objects.filter(
+        followers_count__gt=settings.TIMELINE_FANOUT_THRESHOLD
+    ).update(fanout_paused=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_post_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='fanout_paused',
+            field=models.BooleanField(default=False, help_text='Посты автора публиковались без раскладки по лентам', verbose_name='Раскладка приостановлена'),
+        ),
+        migrations.RunPython(pause_hot_authors, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,33 @@
+from contextlib import contextmanager
+from threading import local
+
 from django.db import models
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+# Посты, удаляемые в этом потоке: их комментарии уходят каскадом,
+# и сдвигать счётчик комментариев удаляемого поста незачем.
+deleting = local()
+
+
+@contextmanager
+def deleting_posts():
+    """Область удаления постов: pre_delete копит их id до выхода."""
+    if hasattr(deleting, 'posts'):
+        yield deleting.posts
+        return
+    deleting.posts = set()
+    try:
+        yield deleting.posts
+    finally:
+        del deleting.posts
+
+
+def posts_being_deleted():
+    """id постов текущей области удаления, вне области — None."""
+    return getattr(deleting, 'posts', None)
+
 
 class Group(models.Model):
     title = models.CharField(
@@ -25,6 +50,19 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для лент: автор и группа одним JOIN."""
+        return self.select_related('author', 'group')
+
+    def delete(self):
+        with deleting_posts():
+            return super().delete()
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст',
@@ -55,13 +93,60 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comment_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Комментариев',
+    )
+    modified = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx'
+            ),
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='post_pub_date_idx'
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        # comment_count меняют только F()-выражения сигналов комментариев,
+        # поэтому правка поста не пишет загруженное раньше значение.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'comment_count'
+            ]
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with deleting_posts():
+            return super().delete(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Загруженные значения нужны сигналам, чтобы сбросить кеш
+        # прежней группы при переносе поста.
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -87,6 +172,12 @@ class Comment(models.Model):
         auto_now_add=True,
     )
 
+    class Meta:
+        indexes = (models.Index(
+            fields=('post', 'created'),
+            name='comment_post_created_idx'
+        ),)
+
     def __str__(self):
         return self.text[:15]
 
@@ -114,6 +205,73 @@ class Follow(models.Model):
             fields=('user', 'author'),
             name='unique-in-module'
         ),)
+        indexes = (models.Index(
+            fields=('author', 'user'),
+            name='follow_author_user_idx'
+        ),)
 
     def __str__(self):
         return self.user.username
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: пост в ленте подписчика."""
+    user = models.ForeignKey(
+        User,
+        related_name='timeline',
+        on_delete=models.CASCADE,
+        verbose_name='Подписчик',
+    )
+    post = models.ForeignKey(
+        Post,
+        related_name='timeline_entries',
+        on_delete=models.CASCADE,
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+        help_text='Копия Post.pub_date для сортировки ленты',
+    )
+
+    class Meta:
+        constraints = (models.UniqueConstraint(
+            fields=('user', 'post'),
+            name='unique-timeline-entry'
+        ),)
+        indexes = (models.Index(
+            fields=('user', '-pub_date', '-post'),
+            name='timeline_user_pub_date_idx'
+        ),)
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
+
+
+class Profile(models.Model):
+    """Счётчики автора, обновляемые при записи."""
+    user = models.OneToOneField(
+        User,
+        related_name='profile',
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Постов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписчиков',
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписок',
+    )
+    fanout_paused = models.BooleanField(
+        default=False,
+        verbose_name='Раскладка приостановлена',
+        help_text='Посты автора публиковались без раскладки по лентам',
+    )
+
+    def __str__(self):
+        return str(self.user)
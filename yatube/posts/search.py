@@ -0,0 +1,162 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+Таблица posts_post_fts (rowid — id поста) создаётся миграцией 0013
+и обновляется сигналами Post. Выдача упорядочена по bm25 и листается
+курсором (bm25, id). На других СУБД поиск сводится к icontains.
+"""
+import base64
+import binascii
+import re
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connection
+
+from .models import Post
+from .utils import CursorPaginator, get_cursor_page, paginate
+
+FTS_TABLE = 'posts_post_fts'
+TERM_RE = re.compile(r'\w+')
+
+Hit = namedtuple('Hit', 'rank pk')
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def match_query(query):
+    """Запрос в синтаксисе FTS5: все слова обязательны, ищутся по началу.
+
+    Кавычки и операторы FTS5 из ввода отбрасываются.
+    """
+    return ' '.join(f'"{term}"*' for term in TERM_RE.findall(query))
+
+
+def index_post(post):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+            [post.pk, post.text],
+        )
+
+
+def index_posts(posts):
+    """Индексирует пачку (id, text) постов, записанных bulk_create."""
+    if not fts_available() or not posts:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+            [(pk,) for pk, _ in posts],
+        )
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)', posts
+        )
+
+
+def unindex_post(post_id):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+
+def rebuild():
+    """Заново заполняет индекс из posts_post, например после bulk_create."""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text) '
+            f'SELECT id, text FROM {Post._meta.db_table}'
+        )
+
+
+def filter_posts(queryset, query):
+    """Посты queryset, подходящие под запрос, одним запросом к базе."""
+    match = match_query(query)
+    if not match:
+        return queryset.none()
+    if not fts_available():
+        return queryset.filter(text__icontains=query)
+    # Не pk__in=RawSQL(...): Django обернёт подзапрос в двойные скобки,
+    # и SQLite сочтёт его скалярным, вернув только первую строку.
+    table = Post._meta.db_table
+    return queryset.extra(
+        where=[
+            f'"{table}"."id" IN (SELECT rowid FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s)'
+        ],
+        params=[match],
+    )
+
+
+class SearchPaginator(CursorPaginator):
+    """Курсорный пагинатор выдачи FTS5 по (bm25, id).
+
+    bm25 в FTS5 отрицательный: чем меньше, тем лучше совпадение,
+    поэтому выдача идёт по возрастанию.
+    """
+    key = ('rank', 'pk')
+
+    def __init__(self, match, per_page):
+        super().__init__([], per_page)
+        self.match = match
+
+    def encode(self, hit):
+        raw = f'{hit.rank!r}|{hit.pk}'.encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode(self, token):
+        if not token:
+            return None
+        try:
+            padding = '=' * (-len(token) % 4)
+            raw = base64.urlsafe_b64decode(token + padding).decode()
+            rank, pk = raw.split('|')
+            return float(rank), int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            return None
+
+    def _rows(self, after, before, backwards, limit):
+        where, params = '', [self.match]
+        if after or before:
+            rank, pk = after or before
+            sign = '>' if after else '<'
+            where = f'WHERE score {sign} %s OR (score = %s AND id {sign} %s)'
+            params += [rank, rank, pk]
+        order = 'DESC' if backwards else 'ASC'
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT score, id FROM ('
+                f'SELECT bm25({FTS_TABLE}) AS score, rowid AS id '
+                f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+                f') {where} ORDER BY score {order}, id {order} LIMIT %s',
+                params,
+            )
+            return [Hit(*row) for row in cursor.fetchall()]
+
+
+def search_page(request, query):
+    """Страница результатов поиска query, лучшие совпадения первыми."""
+    match = match_query(query)
+    if not match:
+        return paginate(request, Post.objects.none())
+    if not fts_available():
+        return paginate(
+            request, Post.objects.for_feed().filter(text__icontains=query)
+        )
+    paginator = SearchPaginator(match, settings.PAGINATOR_PAGE)
+    page = get_cursor_page(request, paginator)
+    hits = page.object_list
+    posts = Post.objects.for_feed().order_by().in_bulk(
+        [hit.pk for hit in hits]
+    )
+    page.object_list = [posts[hit.pk] for hit in hits if hit.pk in posts]
+    return page
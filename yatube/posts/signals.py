@@ -0,0 +1,92 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import counters, search, thumbnails, timeline
+from .caching import bump_feed, bump_post_feeds
+from .models import (
+    Comment, Follow, Group, Post, Profile, posts_being_deleted
+)
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+def user_profile(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Profile.objects.get_or_create(user=instance)
+
+
+def bump_follows(follow):
+    bump_feed('follows', follow.user_id)
+    bump_feed('follows', follow.author_id)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_profile(instance.author_id, posts_count=1)
+        timeline.fan_out(instance)
+    bump_post_feeds(instance)
+    loaded = getattr(instance, '_loaded_values', {})
+    if created or instance.text != loaded.get('text'):
+        search.index_post(instance)
+    if instance.image and instance.image.name != loaded.get('image'):
+        thumbnails.schedule(instance.image.name)
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    # Вне Post.delete и QuerySet.delete, например при удалении автора,
+    # области нет: счётчики комментариев сдвигаются по одному.
+    deleted = posts_being_deleted()
+    if deleted is not None:
+        deleted.add(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump_profile(instance.author_id, posts_count=-1)
+    timeline.forget_recent_posts(instance.author_id)
+    bump_post_feeds(instance)
+    search.unindex_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_comments(instance.post_id, 1)
+        bump_feed('comments')
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    deleted = posts_being_deleted()
+    if deleted is not None and instance.post_id in deleted:
+        return
+    counters.bump_comments(instance.post_id, -1)
+    bump_feed('comments')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    bump_feed('index')
+    bump_feed('group', instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_profile(instance.author_id, followers_count=1)
+        counters.bump_profile(instance.user_id, following_count=1)
+        timeline.backfill(instance)
+        bump_follows(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump_profile(instance.author_id, followers_count=-1)
+    counters.bump_profile(instance.user_id, following_count=-1)
+    timeline.prune(instance)
+    bump_follows(instance)
@@ -0,0 +1,31 @@
+from django import template
+from django.conf import settings
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/post_card.html')
+def post_card(post):
+    """Карточка поста для лент, кешируется по id и отметке modified."""
+    return {'post': post, 'timeout': settings.FEED_CACHE_TIMEOUT}
+
+
+@register.filter
+def cache_stamp(posts):
+    """Отметка страницы ленты: меняется вместе с любой её карточкой."""
+    return ';'.join(f'{post.pk}:{post.modified.timestamp()}' for post in posts)
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts):
+    """Находит миниатюры всей страницы перед циклом по карточкам."""
+    thumbnails.prefetch_thumbnails(posts)
+    return ''
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(post):
+    """Картинка поста в <picture> со всеми готовыми вариантами."""
+    return {'picture': thumbnails.picture(post.image)}
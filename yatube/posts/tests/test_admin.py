@@ -0,0 +1,78 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class AdminQueriesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.number = 0
+
+    def add_rows(self, count):
+        for _ in range(count):
+            self.number += 1
+            author = User.objects.create_user(username=f'user{self.number}')
+            group = Group.objects.create(
+                title=f'Группа {self.number}', slug=f'group-{self.number}'
+            )
+            post = Post.objects.create(
+                author=author, group=group, text=f'Пост {self.number}'
+            )
+            Comment.objects.create(post=post, author=author, text='Ок')
+            Follow.objects.create(user=self.admin, author=author)
+
+    def queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelists_run_constant_queries(self):
+        """Число запросов на список не растёт вместе с числом строк."""
+        for model in ('post', 'group', 'comment', 'follow'):
+            with self.subTest(model=model):
+                url = reverse(f'admin:posts_{model}_changelist')
+                self.add_rows(2)
+                few = self.queries(url)
+                self.add_rows(8)
+                self.assertEqual(self.queries(url), few)
+
+    def test_change_form_does_not_list_users(self):
+        """Форма поста не грузит всех пользователей в select."""
+        self.add_rows(3)
+        post = Post.objects.get(author__username='user1')
+        response = self.client.get(
+            reverse('admin:posts_post_change', args=(post.pk,))
+        )
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertNotContains(response, 'user3</option>')
+
+    def test_search_without_terms(self):
+        """Поиск, из которого не вышло ни одного слова, не роняет список."""
+        self.add_rows(2)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': '!!!'}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_changelist_keeps_admin_widgets(self):
+        """Поля list_editable получают виджеты админки без автодополнения."""
+        self.add_rows(2)
+        response = self.client.get(reverse('admin:posts_post_changelist'))
+        self.assertContains(response, 'related-widget-wrapper')
+        self.assertNotContains(response, 'admin-autocomplete')
@@ -0,0 +1,112 @@
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(title='Группа', slug='test-slug')
+        for number in range(13):
+            post = Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {number}'
+            )
+        cls.post = post
+        for number in range(settings.COMMENTS_PAGE + 2):
+            Comment.objects.create(
+                post=post, author=cls.reader, text=f'Комментарий {number}'
+            )
+
+    def get(self, name, *args, **params):
+        return self.client.get(reverse(f'api:{name}', args=args), params)
+
+    def test_posts_cursor_pages(self):
+        """Лента постов листается курсорами без повторов."""
+        first = self.get('posts').json()
+        second = self.get('posts', after=first['next_cursor']).json()
+        self.assertEqual(len(first['results']), 10)
+        self.assertEqual(len(second['results']), 3)
+        self.assertIsNone(second['next_cursor'])
+        self.assertEqual(first['results'][0]['id'], self.post.pk)
+        self.assertEqual(first['results'][0]['author'], 'Author')
+        self.assertEqual(first['results'][0]['group'], 'test-slug')
+
+    def test_fields_limit_columns(self):
+        """?fields= убирает лишние столбцы и JOIN из запроса."""
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get('posts', fields='id,text').json()
+        self.assertEqual(set(data['results'][0]), {'id', 'text'})
+        sql = queries.captured_queries[-1]['sql']
+        self.assertNotIn('auth_user', sql)
+        self.assertNotIn('"image"', sql)
+        response = self.get('posts', fields='id,password')
+        self.assertEqual(response.status_code, 400)
+
+    def test_include_authors_and_comments(self):
+        """Авторы и комментарии страницы приходят в том же ответе."""
+        with mock.patch.object(Post, 'from_db') as post_from_db, \
+                mock.patch.object(Comment, 'from_db') as comment_from_db, \
+                self.assertNumQueries(3):
+            data = self.get('posts', include='authors,comments').json()
+        post_from_db.assert_not_called()
+        comment_from_db.assert_not_called()
+        included = data['included']
+        self.assertEqual(
+            [author['username'] for author in included['authors']],
+            ['Author'],
+        )
+        self.assertEqual(included['authors'][0]['posts_count'], 13)
+        comments = included['comments']
+        self.assertEqual(len(comments), settings.COMMENTS_PAGE)
+        self.assertEqual(
+            comments[0]['text'], f'Комментарий {settings.COMMENTS_PAGE + 1}'
+        )
+
+    def test_post_comments(self):
+        """Комментарии поста листаются курсором от новых к старым."""
+        first = self.get('post_comments', self.post.pk).json()
+        second = self.get(
+            'post_comments', self.post.pk, after=first['next_cursor']
+        ).json()
+        self.assertEqual(len(first['results']), settings.COMMENTS_PAGE)
+        self.assertEqual(len(second['results']), 2)
+
+    def test_details(self):
+        """Пост, группа и профиль; несуществующий объект — 404."""
+        self.assertEqual(
+            self.get('post_detail', self.post.pk, fields='text').json(),
+            {'text': 'Пост 12'},
+        )
+        self.assertEqual(
+            self.get('group_detail', 'test-slug').json()['title'], 'Группа'
+        )
+        self.assertEqual(
+            self.get('groups', fields='slug').json(),
+            {'results': [{'slug': 'test-slug'}]},
+        )
+        profile = self.get('profile', 'Author').json()
+        self.assertEqual(profile['posts_count'], 13)
+        self.assertNotIn('password', profile)
+        self.assertEqual(self.get('post_detail', 999).status_code, 404)
+        self.assertEqual(self.get('profile', 'nobody').status_code, 404)
+
+    def test_follow_requires_login(self):
+        """Лента подписок доступна только авторизованным."""
+        self.assertEqual(self.get('follow').status_code, 401)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.reader)
+        data = self.get('follow', fields='id').json()
+        self.assertEqual(len(data['results']), 10)
+        self.assertEqual(data['results'][0], {'id': self.post.pk})
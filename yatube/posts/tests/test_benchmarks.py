@@ -0,0 +1,61 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from posts.models import Comment, Follow, Post
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkCommandsTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_seed_and_benchmark(self):
+        """seed_data наполняет базу, benchmark_views ловит регрессии."""
+        call_command(
+            'seed_data', '--users=10', '--posts=30', '--comments=60',
+            '--follows-per-user=3', '--images=1', stdout=io.StringIO(),
+        )
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertEqual(Comment.objects.count(), 60)
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(Post.objects.exclude(image='').exists())
+
+        output = os.path.join(self.directory, 'benchmark.json')
+        call_command(
+            'benchmark_views', '--samples=1', '--warmup=0', '--cold',
+            f'--output={output}', stdout=io.StringIO(),
+        )
+        with open(output) as result_file:
+            report = json.load(result_file)
+        results = report['results']
+        self.assertEqual(results['posts:post_detail']['status'], 200)
+        self.assertIn('users:login', results)
+        self.assertIn('api:follow', results)
+        self.assertEqual(report['meta']['posts'], 30)
+
+        baseline = os.path.join(self.directory, 'baseline.json')
+        results['posts:index']['queries'] -= 1
+        with open(baseline, 'w') as baseline_file:
+            json.dump(report, baseline_file)
+        with self.assertRaisesMessage(CommandError, 'Регрессий'):
+            call_command(
+                'benchmark_views', '--samples=1', '--warmup=0', '--cold',
+                f'--output={output}', f'--baseline={baseline}',
+                '--tolerance=100', stdout=io.StringIO(),
+                stderr=io.StringIO(),
+            )
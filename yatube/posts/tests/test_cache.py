@@ -1,7 +1,11 @@
+import time
+from unittest.mock import patch
+
 from django.test import TestCase
-from django.test.client import Client
-from posts.models import Post
+from posts.models import Comment, Group, Post
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.urls import reverse
 
 User = get_user_model()
@@ -12,17 +16,116 @@ class CacheTests(TestCase):
     def setUpClass(cls):
         super().setUpClass()
         cls.user = User.objects.create_user(username='User')
+        cls.group = Group.objects.create(title='Группа', slug='cached')
         cls.post = Post.objects.create(
             author=cls.user,
+            group=cls.group,
             text='Cached',
         )
 
+    def setUp(self):
+        cache.clear()
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'cached'}),
+            reverse('posts:profile', kwargs={'username': 'User'}),
+        )
+
     def test_cache_index(self):
         """Кеширования главной страницы."""
         response_initial = self.client.get(reverse('posts:index'))
         index_initial = response_initial.content
-        post = Post.objects.get(text='Cached')
-        post.delete()
+        Post.objects.filter(text='Cached').update(text='Changed')
         response_cached = self.client.get(reverse('posts:index'))
         index_cached = response_cached.content
         self.assertEqual(index_initial, index_cached)
+
+    def test_feeds_are_cached(self):
+        """Ленты отдаются из кеша, пока не изменились посты."""
+        for url in self.urls:
+            self.client.get(url)
+        Post.objects.filter(pk=self.post.pk).update(text='Changed')
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Cached')
+
+    def test_new_post_invalidates_feeds(self):
+        """Новый пост сразу виден на главной, в группе и в профиле."""
+        for url in self.urls:
+            self.client.get(url)
+        Post.objects.create(author=self.user, group=self.group, text='Fresh')
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Fresh')
+
+    def test_deleted_post_leaves_feeds(self):
+        """Удалённый пост сразу пропадает из лент."""
+        for url in self.urls:
+            self.client.get(url)
+        Post.objects.get(pk=self.post.pk).delete()
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertNotContains(self.client.get(url), 'Cached')
+
+    def test_comment_invalidates_index(self):
+        """Новый комментарий обновляет счётчик на главной."""
+        self.client.get(reverse('posts:index'))
+        Comment.objects.create(post=self.post, author=self.user, text='Да')
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Комментариев: 1')
+
+    def test_moved_post_invalidates_old_group(self):
+        """Перенос поста в другую группу обновляет прежнюю группу."""
+        url = reverse('posts:group_list', kwargs={'slug': 'cached'})
+        self.client.get(url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = Group.objects.create(title='Другая', slug='other')
+        post.save()
+        self.assertNotContains(self.client.get(url), 'Cached')
+
+    def test_group_change_invalidates_feeds(self):
+        """Изменение группы обновляет ссылки на неё в лентах."""
+        self.client.get(reverse('posts:index'))
+        self.group.slug = 'moved'
+        self.group.save()
+        self.assertContains(
+            self.client.get(reverse('posts:index')), '/group/moved/'
+        )
+
+    def test_edit_invalidates_only_its_card(self):
+        """Правка поста сбрасывает только его карточку."""
+        other = Post.objects.create(author=self.user, text='Other')
+        self.client.get(reverse('posts:index'))
+        Post.objects.filter(pk=other.pk).update(text='Other changed')
+        self.client.force_login(self.user)
+        self.client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            {'text': 'Edited'},
+        )
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Edited')
+        self.assertContains(response, 'Other')
+        self.assertNotContains(response, 'Other changed')
+
+    def test_cards_are_shared_between_feeds(self):
+        """Карточка, собранная на главной, берётся из кеша в профиле."""
+        self.client.get(reverse('posts:index'))
+        Post.objects.filter(pk=self.post.pk).update(text='Changed')
+        Group.objects.filter(pk=self.group.pk).update(title='Другая')
+        Post.objects.create(author=self.user, text='Fresh')
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'User'})
+        )
+        self.assertContains(response, 'Fresh')
+        self.assertContains(response, 'Cached')
+
+    def test_updates_visible_after_cache_timeout(self):
+        """Правка в обход сигналов видна в лентах через FEED_CACHE_TIMEOUT."""
+        for url in self.urls:
+            self.client.get(url)
+        Post.objects.filter(pk=self.post.pk).update(text='Changed')
+        later = time.time() + settings.FEED_CACHE_TIMEOUT + 1
+        with patch('time.time', return_value=later):
+            for url in self.urls:
+                with self.subTest(url=url):
+                    self.assertContains(self.client.get(url), 'Changed')
@@ -0,0 +1,128 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import DatabaseError, transaction
+from django.db.models.sql import DeleteQuery
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Post, Profile
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+
+    def profile(self, user):
+        return Profile.objects.get(user=user)
+
+    def test_comment_count(self):
+        """Комментарии увеличивают и уменьшают счётчик поста."""
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Комментарий'},
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        comment = Comment.objects.get(post=self.post)
+        self.client.get(reverse(
+            'posts:comment_delete',
+            kwargs={'post_id': self.post.pk, 'comment_id': comment.pk},
+        ))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+
+    def test_post_save_keeps_comment_count(self):
+        """Правка поста не затирает счётчик, выросший после загрузки."""
+        post = Post.objects.get(pk=self.post.pk)
+        Comment.objects.create(post=self.post, author=self.reader, text='К')
+        post.text = 'Правка'
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Правка')
+        self.assertEqual(post.comment_count, 1)
+
+    def test_aborted_post_delete_keeps_counting(self):
+        """Прерванное удаление поста не мешает считать его комментарии."""
+        comment = Comment.objects.create(
+            post=self.post, author=self.reader, text='К'
+        )
+        failing = patch.object(
+            DeleteQuery, 'delete_batch', side_effect=DatabaseError
+        )
+        with self.assertRaises(DatabaseError), transaction.atomic(), failing:
+            Post.objects.get(pk=self.post.pk).delete()
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+
+    def test_posts_count(self):
+        """Создание и удаление постов меняют счётчик автора."""
+        self.assertEqual(self.profile(self.author).posts_count, 1)
+        post = Post.objects.create(author=self.author, text='Ещё')
+        self.assertEqual(self.profile(self.author).posts_count, 2)
+        post.delete()
+        self.assertEqual(self.profile(self.author).posts_count, 1)
+
+    def test_profile_page_without_profile(self):
+        """Профиль без строки Profile, например после loaddata, открывается."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Profile.objects.filter(user=self.author).delete()
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'Author'})
+        )
+        self.assertContains(response, 'Всего постов: 1')
+        profile = self.profile(self.author)
+        self.assertEqual(profile.posts_count, 1)
+        self.assertEqual(profile.followers_count, 1)
+
+    def test_follow_counts(self):
+        """Подписка и отписка меняют счётчики обеих сторон."""
+        self.client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'Author'})
+        )
+        self.assertEqual(self.profile(self.author).followers_count, 1)
+        self.assertEqual(self.profile(self.reader).following_count, 1)
+        self.client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'Author'})
+        )
+        self.assertEqual(self.profile(self.author).followers_count, 0)
+        self.assertEqual(self.profile(self.reader).following_count, 0)
+
+    def test_profile_page_reads_counters(self):
+        """Профиль берёт число постов из счётчика без COUNT(*)."""
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'Author'})
+        )
+        self.assertContains(response, 'Всего постов: 1')
+
+    def test_repair_counters(self):
+        """Команда repair_counters исправляет расхождения."""
+        Profile.objects.filter(user=self.author).update(posts_count=7)
+        Post.objects.filter(pk=self.post.pk).update(comment_count=3)
+        Follow.objects.bulk_create([
+            Follow(user=self.reader, author=self.author)
+        ])
+        Profile.objects.filter(user=self.reader).delete()
+        out = StringIO()
+        call_command('repair_counters', batch_size=1, stdout=out)
+        self.assertIn(
+            'профилей создано 1, постов 1, профилей 2', out.getvalue()
+        )
+        author = self.profile(self.author)
+        self.assertEqual(author.posts_count, 1)
+        self.assertEqual(author.followers_count, 1)
+        self.assertEqual(self.profile(self.reader).following_count, 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
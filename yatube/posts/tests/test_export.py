@@ -0,0 +1,91 @@
+import csv
+import io
+import json
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.export import export_lines
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Author')
+        cls.group = Group.objects.create(title='Группа', slug='test-slug')
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Пост, с "кавычками"',
+            image='posts/small.gif',
+        )
+        cls.comment = Comment.objects.create(
+            post=cls.post, author=cls.user, text='Комментарий'
+        )
+        other = User.objects.create_user(username='Other')
+        Post.objects.create(author=other, text='Чужой пост')
+
+    def test_ndjson_export(self):
+        """Поток NDJSON: свои посты, затем комментарии, картинки ссылкой."""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('posts:export'))
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in
+                b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(
+            [(row['type'], row['id']) for row in rows],
+            [('post', self.post.pk), ('comment', self.comment.pk)],
+        )
+        self.assertEqual(rows[0]['group'], 'test-slug')
+        self.assertEqual(
+            rows[0]['image'], 'http://testserver/media/posts/small.gif'
+        )
+        self.assertEqual(rows[1]['post'], self.post.pk)
+
+    def test_csv_export_and_command(self):
+        """CSV из представления совпадает с выгрузкой команды."""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('posts:export'), {'format': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        content = b''.join(response.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(rows[0]['text'], 'Пост, с "кавычками"')
+        output = io.StringIO()
+        call_command('export_posts', 'Author', '--format=csv', stdout=output)
+        command_rows = list(csv.DictReader(io.StringIO(output.getvalue())))
+        self.assertEqual(
+            [row['id'] for row in command_rows], [row['id'] for row in rows]
+        )
+
+    def test_export_requires_login(self):
+        """Выгрузка только своего аккаунта и только в известном формате."""
+        response = self.client.get(reverse('posts:export'))
+        self.assertEqual(response.status_code, 302)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('posts:export'), {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(EXPORT_CHUNK_SIZE=100)
+    def test_memory_does_not_grow_with_account(self):
+        """Пик памяти выгрузки не зависит от числа постов."""
+        def peak(count):
+            Post.objects.bulk_create(
+                Post(author=self.user, text='x' * 1000)
+                for _ in range(count)
+            )
+            tracemalloc.start()
+            for _ in export_lines(self.user, 'ndjson'):
+                pass
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            return peak
+
+        small = peak(200)
+        large = peak(3000)
+        # Список из 3000 постов занял бы несколько мегабайт.
+        self.assertLess(large, small * 2)
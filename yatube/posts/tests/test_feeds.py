@@ -0,0 +1,105 @@
+import time
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils.http import parse_http_date
+
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class FeedsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.group = Group.objects.create(title='Группа', slug='test-slug')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Первый пост'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def urls(self):
+        urls = {}
+        for kind in ('rss', 'atom'):
+            urls[f'index_{kind}'] = reverse(f'posts:index_{kind}')
+            urls[f'group_{kind}'] = reverse(
+                f'posts:group_{kind}', args=('test-slug',)
+            )
+            urls[f'profile_{kind}'] = reverse(
+                f'posts:profile_{kind}', args=('Author',)
+            )
+        return urls
+
+    def test_feeds_list_posts(self):
+        """Ленты отдают посты в нужном формате."""
+        for name, url in self.urls().items():
+            with self.subTest(feed=name):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                kind = 'rss' if name.endswith('rss') else 'atom'
+                self.assertIn(kind, response['Content-Type'])
+                self.assertContains(response, 'Первый пост')
+        response = self.client.get(
+            reverse('posts:group_rss', args=('missing',))
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_repeated_polls_skip_database(self):
+        """Повторный опрос — кеш или 304 без единого запроса."""
+        for name, url in self.urls().items():
+            with self.subTest(feed=name):
+                first = self.client.get(url)
+                with self.assertNumQueries(0):
+                    cached = self.client.get(url)
+                    by_etag = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=first['ETag']
+                    )
+                    by_date = self.client.get(
+                        url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']
+                    )
+                self.assertEqual(cached.content, first.content)
+                self.assertEqual(by_etag.status_code, 304)
+                self.assertEqual(by_date.status_code, 304)
+
+    def test_new_post_invalidates_feeds(self):
+        """Новый пост сбрасывает кеш всех лент, где он виден."""
+        etags = {name: self.client.get(url)['ETag']
+                 for name, url in self.urls().items()}
+        Post.objects.create(
+            author=self.author, group=self.group, text='Второй пост'
+        )
+        for name, url in self.urls().items():
+            with self.subTest(feed=name):
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[name]
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'Второй пост')
+
+    def test_delete_moves_last_modified_forward(self):
+        """Удаление последнего поста сдвигает Last-Modified вперёд."""
+        newest = Post.objects.create(
+            author=self.author, group=self.group, text='Второй пост'
+        )
+        dates = {name: self.client.get(url)['Last-Modified']
+                 for name, url in self.urls().items()}
+        with patch('time.time_ns', return_value=time.time_ns() + 60 * 10**9):
+            newest.delete()
+        for name, url in self.urls().items():
+            with self.subTest(feed=name):
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=dates[name]
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertNotContains(response, 'Второй пост')
+                self.assertGreater(
+                    parse_http_date(response['Last-Modified']),
+                    parse_http_date(dates[name]),
+                )
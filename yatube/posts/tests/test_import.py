@@ -0,0 +1,193 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from unittest.mock import call, patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from posts import search
+from posts.export import export_lines
+from posts.models import Comment, Follow, Group, Post, TimelineEntry
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+User = get_user_model()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImportPostsTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        with open(os.path.join(self.directory, 'cat.gif'), 'wb') as image:
+            image.write(b'GIF89a')
+        # Уже существующий пост: id импорта не должны с ним пересечься.
+        self.existing = Post.objects.create(
+            author=User.objects.create_user(username='Old'), text='Старый'
+        )
+        self.rows = [
+            {'type': 'follow', 'user': 'reader', 'author': 'author'},
+            {'type': 'post', 'id': 1, 'author': 'author', 'group': 'cats',
+             'date': '2020-01-02T03:04:05+00:00', 'text': 'Котики',
+             'image': 'cat.gif'},
+            {'type': 'post', 'id': 2, 'author': 'author',
+             'date': '2020-01-03T00:00:00+00:00', 'text': 'Собаки'},
+            {'type': 'comment', 'id': 1, 'post': 1, 'author': 'reader',
+             'text': 'Мяу'},
+        ]
+
+    def write(self, rows, extra=''):
+        path = os.path.join(self.directory, 'posts.ndjson')
+        with open(path, 'w', encoding='utf-8') as source:
+            for row in rows:
+                source.write(json.dumps(row, ensure_ascii=False) + '\n')
+            source.write(extra)
+        return path
+
+    def run_import(self, path, *options):
+        output = io.StringIO()
+        call_command(
+            'import_posts', path, '--batch-size=2',
+            f'--images-dir={self.directory}', *options,
+            stdout=output, stderr=io.StringIO(),
+        )
+        return output.getvalue()
+
+    def test_import(self):
+        """Посты, комментарии и подписки загружаются со всеми следствиями."""
+        output = self.run_import(self.write(self.rows))
+        self.assertIn('строк/с', output)
+        cats = Post.objects.get(text='Котики')
+        self.assertNotEqual(cats.pk, self.existing.pk)
+        self.assertEqual(
+            cats.pub_date, timezone.make_aware(datetime(2020, 1, 2, 3, 4, 5))
+        )
+        self.assertEqual(cats.group, Group.objects.get(slug='cats'))
+        self.assertTrue(os.path.exists(cats.image.path))
+        self.assertEqual(cats.author.profile.posts_count, 2)
+        self.assertEqual(
+            Comment.objects.get(text='Мяу').post.comment_count, 1
+        )
+        reader = User.objects.get(username='reader')
+        self.assertTrue(Follow.objects.filter(user=reader).exists())
+        self.assertEqual(TimelineEntry.objects.filter(user=reader).count(), 2)
+        self.assertTrue(
+            search.filter_posts(Post.objects.all(), 'котики').exists()
+        )
+
+    def test_resume_from_checkpoint(self):
+        """После ошибки импорт продолжается без повторов."""
+        path = self.write(self.rows, extra='{broken\n')
+        with self.assertRaises(CommandError):
+            self.run_import(path)
+        self.assertEqual(Post.objects.count(), 3)
+        extra = {'type': 'post', 'id': 3, 'author': 'author', 'text': 'Ещё'}
+        self.write(self.rows + [extra])
+        self.run_import(path)
+        self.assertEqual(Post.objects.count(), 4)
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_comments_to_other_posts_skipped(self):
+        """Комментарий к посту не из файла не попадает к чужому посту."""
+        orphans = [
+            {'type': 'comment', 'id': 2, 'post': 0, 'author': 'reader',
+             'text': 'Не сюда'},
+            {'type': 'comment', 'id': 3, 'post': 99, 'author': 'reader',
+             'text': 'Некуда'},
+        ]
+        output = self.run_import(self.write(self.rows + orphans))
+        self.assertIn('без поста в файле: 2', output)
+        self.assertEqual(Comment.objects.get().text, 'Мяу')
+        self.assertFalse(self.existing.comments.exists())
+
+    def test_resume_refreshes_feeds_of_whole_import(self):
+        """Продолжение сбрасывает и ленты строк до остановки."""
+        path = self.write(self.rows, extra='{broken\n')
+        with self.assertRaises(CommandError):
+            self.run_import(path)
+        self.write(self.rows)
+        target = 'posts.management.commands.import_posts.bump_feed'
+        with patch(target) as bump_feed:
+            self.run_import(path)
+        author = User.objects.get(username='author')
+        bump_feed.assert_has_calls([
+            call('group', Group.objects.get(slug='cats').pk),
+            call('author', author.pk),
+        ], any_order=True)
+
+    def test_export_round_trip(self):
+        """Выгрузка export_posts загружается обратно вместе с картинками."""
+        writer = User.objects.create_user(username='writer')
+        post = Post.objects.create(
+            author=writer, text='С картинкой',
+            image=ContentFile(b'GIF89a', name='dog.gif'),
+        )
+        Comment.objects.create(post=post, author=writer, text='Свой')
+        Comment.objects.create(
+            post=self.existing, author=writer, text='Чужой'
+        )
+        path = os.path.join(self.directory, 'export.ndjson')
+        with open(path, 'w', encoding='utf-8') as source:
+            source.writelines(export_lines(writer, 'ndjson'))
+        output = self.run_import(
+            path, f'--images-dir={TEMP_MEDIA_ROOT}', '--author=copy'
+        )
+        self.assertIn('без поста в файле: 1', output)
+        copy = Post.objects.get(author__username='copy')
+        with copy.image.open() as image:
+            self.assertEqual(image.read(), b'GIF89a')
+        self.assertEqual(copy.comments.get().text, 'Свой')
+
+    def test_site_posts_during_import_kept_apart(self):
+        """Посты сайта между запусками не путаются с загруженными."""
+        first = {'type': 'post', 'id': 1, 'author': 'author',
+                 'text': 'imported one'}
+        path = self.write([first])
+        self.run_import(path)
+        live = Post.objects.create(author=self.existing.author, text='giraffe')
+        self.write([
+            first,
+            {'type': 'post', 'id': 2, 'author': 'author', 'text': 'zebra'},
+            {'type': 'comment', 'id': 1, 'post': 2, 'author': 'reader',
+             'text': 'Полоски'},
+        ])
+        self.run_import(path)
+        zebra = Post.objects.get(text='zebra')
+        self.assertEqual(zebra.comments.get().text, 'Полоски')
+        self.assertFalse(live.comments.exists())
+        for text, post in (('giraffe', live), ('zebra', zebra)):
+            with self.subTest(text=text):
+                self.assertEqual(
+                    list(search.filter_posts(Post.objects.all(), text)),
+                    [post],
+                )
+
+    def test_site_post_taking_reserved_id(self):
+        """Пост сайта, занявший id пачки, остаётся, пачка берёт другие."""
+        site = Post.objects.create(author=self.existing.author, text='Сайт')
+        original = Post.objects.aggregate
+        stale = [{'max': site.pk - 1}]
+
+        def aggregate(*args, **kwargs):
+            # Максимум прочитан до того, как сайт сохранил свой пост.
+            return stale.pop() if stale else original(*args, **kwargs)
+
+        with patch.object(Post.objects, 'aggregate', aggregate):
+            self.run_import(self.write(self.rows))
+        self.assertEqual(Post.objects.get(pk=site.pk).text, 'Сайт')
+        self.assertEqual(
+            Comment.objects.get(text='Мяу').post.text, 'Котики'
+        )
@@ -0,0 +1,112 @@
+from importlib import import_module
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.slow_queries import fingerprint
+from posts.budgets import QUERY_BUDGETS, budget_report
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+URLCONFS = (
+    ('posts', 'posts.urls'),
+    ('api', 'posts.api_urls'),
+    ('users', 'users.urls'),
+)
+
+
+class QueryBudgetTests(TestCase):
+    """Каждый адрес укладывается в бюджет запросов на полной странице."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        groups = [
+            Group.objects.create(title=f'Группа {number}', slug=f'g{number}')
+            for number in range(3)
+        ]
+        readers = [
+            User.objects.create_user(username=f'reader{number}')
+            for number in range(12)
+        ]
+        # Страницы заполнены постами разных авторов, групп и картинок,
+        # чтобы запрос на строку сразу превысил бюджет.
+        for number, reader in enumerate(readers):
+            Follow.objects.create(user=cls.author, author=reader)
+            Follow.objects.create(user=reader, author=cls.author)
+            Post.objects.create(
+                author=reader, group=groups[number % 3],
+                text=f'Пост читателя {number}',
+                image=f'posts/reader{number}.jpg',
+            )
+        for number in range(12):
+            cls.post = Post.objects.create(
+                author=cls.author, group=groups[number % 3],
+                text=f'Пост автора {number}',
+                image=f'posts/author{number}.jpg',
+            )
+        for reader in readers * 2:
+            Comment.objects.create(post=cls.post, author=reader, text='Ок')
+        cls.comment = Comment.objects.create(
+            post=cls.post, author=cls.author, text='Свой'
+        )
+        cls.params = {
+            'post_id': cls.post.pk,
+            'comment_id': cls.comment.pk,
+            'slug': 'g0',
+            'username': readers[0].username,
+        }
+
+    def setUp(self):
+        self.client.force_login(self.author)
+
+    def url_names(self):
+        for namespace, urlconf in URLCONFS:
+            for pattern in import_module(urlconf).urlpatterns:
+                yield f'{namespace}:{pattern.name}', {
+                    key: self.params[key]
+                    for key in pattern.pattern.converters
+                }
+
+    def test_every_url_has_budget(self):
+        """Новый адрес без бюджета в QUERY_BUDGETS не пройдёт."""
+        missing = [name for name, _ in self.url_names()
+                   if name not in QUERY_BUDGETS]
+        self.assertEqual(missing, [], 'Добавьте бюджет в QUERY_BUDGETS')
+
+    def test_views_within_budget(self):
+        """Холодный кеш, вход под автором поста, изменения откатываются."""
+        failures = []
+        for name, kwargs in self.url_names():
+            if '_auth_user_id' not in self.client.session:
+                self.client.force_login(self.author)
+            cache.clear()
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(reverse(name, kwargs=kwargs))
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                transaction.set_rollback(True)
+            budget = QUERY_BUDGETS.get(name)
+            if budget is not None and len(queries) > budget:
+                failures.append(
+                    budget_report(name, budget, queries.captured_queries)
+                )
+        self.assertFalse(failures, '\n\n'.join(failures))
+
+    def test_fingerprint_groups_parameters(self):
+        """Отпечаток не зависит от значений и длины списка IN."""
+        self.assertEqual(
+            fingerprint(
+                'SELECT * FROM "posts_post" WHERE "id" IN (1, 2,3) '
+                "AND \"text\" = 'it''s'  LIMIT 11"
+            ),
+            'SELECT * FROM "posts_post" WHERE "id" IN (...) '
+            'AND "text" = ? LIMIT ?',
+        )
@@ -0,0 +1,103 @@
+import re
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?\w+$')
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class QueryPlanTests(TestCase):
+    """Запросы страниц идут по индексам без полного скана и сортировки."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(title='Группа', slug='test-slug')
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(15):
+            post = Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {number}'
+            )
+            Comment.objects.create(post=post, author=cls.reader, text='Ок')
+        cls.post = post
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def assert_plans(self, queries):
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.startswith(('SELECT', 'UPDATE', 'DELETE')):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = [row[-1] for row in cursor.fetchall()]
+            for step in plan:
+                with self.subTest(sql=sql, step=step):
+                    self.assertIsNone(
+                        FULL_SCAN.match(step), 'полный скан таблицы'
+                    )
+                    self.assertNotIn(TEMP_SORT, step, 'сортировка в памяти')
+
+    def get_pages(self, url):
+        """Первая, следующая, предыдущая и последняя страницы ленты."""
+        with CaptureQueriesContext(connection) as queries:
+            page_obj = self.client.get(url).context['page_obj']
+            second = self.client.get(
+                url, {'after': page_obj.next_cursor}
+            ).context['page_obj']
+            self.client.get(url, {'before': second.previous_cursor})
+            self.client.get(url, {'last': 1})
+        return queries
+
+    def test_feed_plans(self):
+        """Ленты используют составные индексы по дате."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'Author'}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assert_plans(self.get_pages(url))
+
+    def test_post_detail_plans(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+            )
+        self.assert_plans(queries)
+
+    def test_write_plans(self):
+        """Запись поста, комментария и подписки не сканирует таблицы."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(
+                reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+                {'text': 'Ещё'},
+            )
+            for name in ('posts:profile_unfollow', 'posts:profile_follow'):
+                self.client.get(reverse(name, kwargs={'username': 'Author'}))
+            self.client.force_login(self.author)
+            self.client.post(
+                reverse('posts:create_post'),
+                {'text': 'Новый', 'group': self.group.pk},
+            )
+            self.client.get(reverse(
+                'posts:post_delete', kwargs={'post_id': self.post.pk}
+            ))
+        self.assert_plans(queries)
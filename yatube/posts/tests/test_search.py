@@ -0,0 +1,97 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import search
+from posts.models import Post
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Author')
+        cls.milk = Post.objects.create(
+            author=cls.user, text='Котики любят молоко'
+        )
+        cls.bones = Post.objects.create(
+            author=cls.user, text='Собаки любят кости'
+        )
+        cls.more_milk = Post.objects.create(
+            author=cls.user, text='Молоко, молоко и ещё раз молоко'
+        )
+
+    def find(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+        return response.context['page_obj']
+
+    def test_results_ranked_by_bm25(self):
+        """Лучшее совпадение идёт первым, лишние посты не попадают."""
+        self.assertEqual(
+            list(self.find('молоко')), [self.more_milk, self.milk]
+        )
+
+    def test_prefix_and_all_terms(self):
+        """Слова ищутся по началу, и в посте должны быть все."""
+        self.assertEqual(list(self.find('кот')), [self.milk])
+        self.assertEqual(list(self.find('любят кости')), [self.bones])
+
+    def test_index_follows_edits_and_deletes(self):
+        """Сигналы обновляют индекс при правке и удалении поста."""
+        post = Post.objects.get(pk=self.bones.pk)
+        post.text = 'Собаки грызут палки'
+        post.save()
+        self.assertEqual(list(self.find('кости')), [])
+        self.assertEqual(list(self.find('палки')), [self.bones])
+        post.delete()
+        self.assertEqual(list(self.find('палки')), [])
+
+    def test_fts_syntax_in_query_is_ignored(self):
+        """Кавычки и операторы FTS5 во вводе не ломают запрос."""
+        page_obj = self.find('"молоко)* -кот')
+        self.assertEqual(list(page_obj), [self.milk])
+        self.assertEqual(list(self.find('!!!')), [])
+
+    def test_cursor_pages(self):
+        """Выдача листается курсором без повторов."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Кефир номер {number}')
+            for number in range(13)
+        )
+        search.rebuild()
+        first_page = self.find('кефир')
+        second_page = self.find('кефир', after=first_page.next_cursor)
+        self.assertEqual(len(first_page), 10)
+        self.assertEqual(len(second_page), 3)
+        self.assertFalse(
+            {post.pk for post in first_page}
+            & {post.pk for post in second_page}
+        )
+        previous_page = self.find(
+            'кефир', before=second_page.previous_cursor
+        )
+        self.assertEqual(list(previous_page), list(first_page))
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт через FTS5, а не LIKE."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client.force_login(admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('admin:posts_post_changelist'), {'q': 'молоко'}
+            )
+        self.assertEqual(
+            set(response.context['cl'].result_list),
+            {self.milk, self.more_milk},
+        )
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertIn('posts_post_fts', sql)
+        self.assertNotIn('LIKE', sql)
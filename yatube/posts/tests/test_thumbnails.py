@@ -0,0 +1,154 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from sorl.thumbnail import get_thumbnail
+
+from posts import background
+from posts.models import Post
+from posts.thumbnails import picture_variants, pregenerate
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+User = get_user_model()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def main_thumbnail(self, post):
+        """Вариант для <img>: последний формат, ширина кадра."""
+        variant = [
+            variant for variant in picture_variants()
+            if variant.width == settings.POST_IMAGE_SIZE[0]
+        ][-1]
+        return get_thumbnail(post.image, variant.geometry, **variant.options)
+
+    def create_post(self):
+        with mock.patch('posts.thumbnails.schedule') as schedule:
+            post = Post.objects.create(
+                author=self.user,
+                text='Пост с картинкой',
+                image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+            )
+        schedule.assert_called_once_with(post.image.name)
+        return post
+
+    def test_saving_image_schedules_thumbnails(self):
+        """Новая картинка отправляется в пул, правка текста — нет."""
+        post = self.create_post()
+        post = Post.objects.get(pk=post.pk)
+        with mock.patch('posts.thumbnails.schedule') as schedule:
+            post.text = 'Новый текст'
+            post.save()
+        schedule.assert_not_called()
+
+    def test_missing_thumbnail_cached(self):
+        """Промах по миниатюре не ходит в базу на каждой отрисовке."""
+        post = self.create_post()
+        self.main_thumbnail(post)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.main_thumbnail(post).url, post.image.url)
+        pregenerate(post.image.name)
+        self.assertNotEqual(self.main_thumbnail(post).url, post.image.url)
+
+    def test_in_memory_database_runs_inline(self):
+        """Процессы пула не видят тестовую базу в памяти."""
+        calls = []
+        with mock.patch('posts.background.get_pool') as get_pool:
+            with mock.patch('posts.background.transaction.on_commit',
+                            lambda run: run()):
+                background.submit(calls.append, 'posts/small.gif')
+        get_pool.assert_not_called()
+        self.assertEqual(calls, ['posts/small.gif'])
+
+    def test_original_image_until_thumbnail_is_ready(self):
+        """До построения миниатюры шаблоны получают исходную картинку."""
+        post = self.create_post()
+        self.assertEqual(self.main_thumbnail(post).url, post.image.url)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, f'src="{post.image.url}"')
+        pregenerate(post.image.name)
+        thumbnail = self.main_thumbnail(post)
+        self.assertNotEqual(thumbnail.url, post.image.url)
+        self.assertEqual(thumbnail.width, 960)
+        self.assertTrue(thumbnail.name.startswith('posts/small'))
+        # Сдвиг modified сбрасывает закешированную карточку.
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, f'src="{thumbnail.url}"')
+
+    def test_ready_thumbnail_changes_etags(self):
+        """Готовые варианты меняют ETag лент с постом."""
+        post = self.create_post()
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', args=(post.author.username,)),
+        )
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        pregenerate(post.image.name)
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url]
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_feed_page_reads_thumbnails_once(self):
+        """Миниатюры всей страницы ленты читаются одним запросом."""
+        posts = [self.create_post() for _ in range(3)]
+        for post in posts[:2]:
+            pregenerate(post.image.name)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+        kvstore_queries = [
+            query for query in queries.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+        for post in posts[:2]:
+            self.assertContains(response, self.main_thumbnail(post).url)
+        self.assertContains(response, posts[2].image.url)
+
+    @override_settings(POST_IMAGE_FORMATS=['PNG', 'JPEG'])
+    def test_picture_srcset(self):
+        """Готовые варианты попадают в <source> и srcset всех ширин."""
+        post = self.create_post()
+        pregenerate(post.image.name)
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertContains(response, '<source type="image/png"')
+        self.assertContains(response, '.png 480w')
+        for width in settings.POST_IMAGE_WIDTHS:
+            self.assertContains(response, f'.jpg {width}w')
+        self.assertContains(response, f'src="{self.main_thumbnail(post).url}"')
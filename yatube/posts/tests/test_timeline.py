@@ -0,0 +1,182 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Follow, Post, Profile, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.follower = User.objects.create_user(username='Follower')
+        cls.stranger = User.objects.create_user(username='Stranger')
+        cls.old_post = Post.objects.create(author=cls.author, text='Старый')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.follower)
+
+    def timeline(self, user):
+        return set(
+            TimelineEntry.objects.filter(user=user).values_list(
+                'post_id', flat=True
+            )
+        )
+
+    def test_follow_backfills_timeline(self):
+        """Подписка добавляет в ленту уже опубликованные посты автора."""
+        self.client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'Author'})
+        )
+        self.assertEqual(self.timeline(self.follower), {self.old_post.pk})
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост попадает только в ленты подписчиков."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        self.client.force_login(self.author)
+        self.client.post(reverse('posts:create_post'), {'text': 'Новый'})
+        new_post = Post.objects.get(text='Новый')
+        self.assertIn(new_post.pk, self.timeline(self.follower))
+        self.assertEqual(self.timeline(self.stranger), set())
+        self.assertEqual(
+            TimelineEntry.objects.get(
+                user=self.follower, post=new_post
+            ).pub_date,
+            new_post.pub_date,
+        )
+
+    def test_unfollow_prunes_timeline(self):
+        """Отписка убирает посты автора из ленты."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        self.client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'Author'})
+        )
+        self.assertEqual(self.timeline(self.follower), set())
+
+    def test_post_delete_prunes_timeline(self):
+        """Удалённый пост пропадает из лент."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(author=self.author, text='Удалить')
+        self.client.force_login(self.author)
+        self.client.get(
+            reverse('posts:post_delete', kwargs={'post_id': post.pk})
+        )
+        self.assertEqual(self.timeline(self.follower), {self.old_post.pk})
+
+    def test_follow_index_reads_timeline(self):
+        """Лента подписок собирается из материализованной ленты."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {number}')
+            for number in range(11)
+        ]
+        response = self.client.get(reverse('posts:follow_index'))
+        page_obj = response.context['page_obj']
+        self.assertEqual(list(page_obj), posts[::-1][:10])
+        response = self.client.get(
+            reverse('posts:follow_index'), {'after': page_obj.next_cursor}
+        )
+        self.assertEqual(
+            list(response.context['page_obj']), [posts[0], self.old_post]
+        )
+
+
+@override_settings(TIMELINE_FANOUT_THRESHOLD=1)
+class HybridTimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.star = User.objects.create_user(username='Star')
+        cls.author = User.objects.create_user(username='Author')
+        cls.follower = User.objects.create_user(username='Follower')
+        cls.fan = User.objects.create_user(username='Fan')
+
+    def setUp(self):
+        cache.clear()
+        Follow.objects.create(user=self.follower, author=self.star)
+        Follow.objects.create(user=self.fan, author=self.star)
+        Follow.objects.create(user=self.follower, author=self.author)
+        self.client.force_login(self.follower)
+
+    def test_hot_author_is_not_fanned_out(self):
+        """Посты автора выше порога не пишутся в ленты подписчиков."""
+        post = Post.objects.create(author=self.star, text='Звезда')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+
+    def test_follow_index_merges_hot_authors(self):
+        """Лента подписок подмешивает посты популярных авторов при чтении."""
+        posts = []
+        for number in range(6):
+            posts.append(Post.objects.create(
+                author=self.star, text=f'Звезда {number}'
+            ))
+            posts.append(Post.objects.create(
+                author=self.author, text=f'Автор {number}'
+            ))
+        expected = posts[::-1]
+        response = self.client.get(reverse('posts:follow_index'))
+        page_obj = response.context['page_obj']
+        self.assertEqual(list(page_obj), expected[:10])
+        response = self.client.get(
+            reverse('posts:follow_index'), {'after': page_obj.next_cursor}
+        )
+        self.assertEqual(list(response.context['page_obj']), expected[10:])
+
+    def test_new_hot_post_is_visible_immediately(self):
+        """Новый пост популярного автора сразу виден в ленте."""
+        self.client.get(reverse('posts:follow_index'))
+        post = Post.objects.create(author=self.star, text='Свежий')
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], post)
+
+    def test_cooling_down_backfills_followers(self):
+        """Автор, опустившийся до порога, дописывается в ленты в фоне."""
+        post = Post.objects.create(author=self.star, text='Звезда')
+        with mock.patch('posts.background.transaction.on_commit') as commit:
+            Follow.objects.filter(user=self.fan, author=self.star).delete()
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        commit.assert_called_once()
+        commit.call_args[0][0]()
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.follower, post=post
+            ).exists()
+        )
+
+    def test_dropping_past_threshold_backfills_once(self):
+        """Массовая отписка ниже порога тоже дописывает ленты."""
+        post = Post.objects.create(author=self.star, text='Звезда')
+        Follow.objects.create(
+            user=User.objects.create_user(username='Reader'), author=self.star
+        )
+        with mock.patch('posts.background.transaction.on_commit',
+                        lambda run: run()):
+            Follow.objects.filter(author=self.star).exclude(
+                user=self.follower
+            ).delete()
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.follower, post=post
+            ).exists()
+        )
+        self.assertFalse(
+            Profile.objects.get(user=self.star).fanout_paused
+        )
+
+    def test_repair_counters_resumes_paused_authors(self):
+        """После подъёма порога ленты дописывает repair_counters."""
+        post = Post.objects.create(author=self.star, text='Звезда')
+        with override_settings(TIMELINE_FANOUT_THRESHOLD=5):
+            call_command('repair_counters', stdout=StringIO())
+        self.assertEqual(
+            TimelineEntry.objects.filter(post=post).count(), 2
+        )
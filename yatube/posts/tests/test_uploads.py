@@ -0,0 +1,174 @@
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts.models import Post
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+User = get_user_model()
+
+# Обработка одной картинки в отдельном процессе: печатает прирост
+# пикового RSS в байтах. VmHWM, в отличие от ru_maxrss, не наследует
+# пик родительского процесса.
+MEASURE_RSS = '''
+import sys
+import django
+django.setup()
+from django.core.files.uploadedfile import UploadedFile
+from PIL import ImageOps, JpegImagePlugin, PngImagePlugin
+from posts.uploads import check_image, prepare_image
+
+
+def peak_rss():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) * 1024
+
+
+upload = UploadedFile(open(sys.argv[1], 'rb'), sys.argv[1], 'image/x')
+before = peak_rss()
+check_image(upload)
+prepare_image(upload)
+print(peak_rss() - before)
+'''
+
+
+def image_file(name, size, mode='RGB', exif=None):
+    image = Image.new(mode, size, 'red')
+    output = io.BytesIO()
+    options = {'exif': exif} if exif is not None else {}
+    image.save(output, Image.registered_extensions()[
+        os.path.splitext(name)[1]
+    ], **options)
+    return SimpleUploadedFile(name, output.getvalue(), 'image/x')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class UploadsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        patcher = mock.patch('posts.thumbnails.schedule')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_post(self, image):
+        return self.client.post(
+            reverse('posts:create_post'),
+            {'text': 'Пост с картинкой', 'image': image},
+        )
+
+    def test_image_is_downscaled_without_exif(self):
+        """Картинка уменьшается, поворачивается по EXIF и теряет его."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Camera'
+        self.create_post(image_file('photo.jpg', (4000, 2000), exif=exif))
+        post = Post.objects.get()
+        with Image.open(post.image.path) as image:
+            self.assertEqual(
+                image.size, (settings.POST_IMAGE_MAX_SIDE // 2,
+                             settings.POST_IMAGE_MAX_SIDE)
+            )
+            self.assertEqual(len(image.getexif()), 0)
+
+    def test_png_loses_exif(self):
+        """EXIF снимается и с PNG, который берёт его из image.info."""
+        exif = Image.Exif()
+        exif[0x0112] = 1
+        exif[0x010F] = 'Camera'
+        self.create_post(image_file('photo.png', (100, 50), exif=exif))
+        with Image.open(Post.objects.get().image.path) as image:
+            self.assertEqual(image.format, 'PNG')
+            self.assertEqual(len(image.getexif()), 0)
+
+    def test_unwritable_format_saved_as_jpeg(self):
+        """Формат, который Pillow не пишет, сохраняется в JPEG или PNG."""
+        upload = image_file('anim.gif', (100, 50))
+        with mock.patch.dict(Image.SAVE):
+            del Image.SAVE['GIF']
+            response = self.create_post(upload)
+        self.assertEqual(response.status_code, 302)
+        post = Post.objects.get()
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'JPEG')
+
+    def test_too_many_pixels_rejected(self):
+        """Картинка больше лимита отклоняется по заголовку."""
+        with mock.patch('posts.uploads.prepare_image') as prepare:
+            response = self.create_post(image_file('wide.png', (4000, 2500)))
+        prepare.assert_not_called()
+        self.assertFalse(Post.objects.exists())
+        self.assertTrue(response.context['form'].has_error(
+            'image', 'image_too_large'
+        ))
+
+    @override_settings(POST_IMAGE_MAX_BYTES=1024)
+    def test_too_large_file_rejected(self):
+        """Файл больше POST_IMAGE_MAX_BYTES не сохраняется."""
+        image = Image.effect_noise((100, 100), 64).convert('RGB')
+        output = io.BytesIO()
+        image.save(output, 'PNG')
+        response = self.create_post(
+            SimpleUploadedFile('noise.png', output.getvalue(), 'image/png')
+        )
+        self.assertFalse(Post.objects.exists())
+        self.assertTrue(response.context['form'].has_error('image'))
+
+
+@unittest.skipUnless(
+    os.path.exists('/proc/self/status'), 'нужен /proc/self/status'
+)
+class UploadMemoryTests(unittest.TestCase):
+    """Пик памяти на загрузку не больше POST_UPLOAD_MAX_RSS."""
+
+    def assert_rss_bounded(self, name, size, mode):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, name)
+            with open(path, 'wb') as output:
+                output.write(image_file(name, size, mode).read())
+            result = subprocess.run(
+                [sys.executable, '-c', MEASURE_RSS, path],
+                cwd=settings.BASE_DIR,
+                env={**os.environ,
+                     'DJANGO_SETTINGS_MODULE': 'yatube.settings'},
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+        peak = int(result.stdout)
+        # Нулевой прирост значит, что замер не видит декодирования.
+        self.assertGreater(peak, 0)
+        self.assertLess(peak, settings.POST_UPLOAD_MAX_RSS)
+
+    def test_large_jpeg(self):
+        """JPEG 24 Мп декодируется draft-режимом в уменьшенном масштабе."""
+        self.assert_rss_bounded('photo.jpg', (6000, 4000), 'RGB')
+
+    def test_png_at_pixel_limit(self):
+        """PNG с альфа-каналом на пределе POST_IMAGE_MAX_PIXELS."""
+        self.assert_rss_bounded('alpha.png', (3264, 2448), 'RGBA')
@@ -6,10 +6,13 @@ from django.shortcuts import get_object_or_404
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django import forms
-from posts.models import Post, Group, Follow
+from posts.models import Comment, Post, Group, Follow, Profile
+from posts.utils import ELLIPSIS, CachedCountPaginator
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -216,6 +219,8 @@ class PaginatorViewsTest(TestCase):
         pk = list(range(1, 14))
         posts = [Post(author=cls.user, group=cls.group, pk=pk) for pk in pk]
         Post.objects.bulk_create(posts)
+        # bulk_create обходит сигналы, счётчик профиля ставим вручную.
+        Profile.objects.filter(user=cls.user).update(posts_count=len(pk))
 
     def test_first_page_contains_ten_records(self):
         """Пагинатор первая страница 10 постов."""
@@ -241,7 +246,285 @@ class PaginatorViewsTest(TestCase):
 
         for url, kwargs in arguments.items():
             with self.subTest(url=url, kwargs=kwargs):
+                first_page = self.client.get(
+                    reverse(url, kwargs=kwargs)
+                ).context['page_obj']
                 response = self.client.get(
-                    reverse(url, kwargs=kwargs) + '?page=2'
+                    reverse(url, kwargs=kwargs),
+                    {'after': first_page.next_cursor},
                 )
-                self.assertEqual(len(response.context['page_obj']), 3)
+                page_obj = response.context['page_obj']
+                self.assertEqual(len(page_obj), 3)
+                self.assertFalse(page_obj.has_next())
+                self.assertTrue(page_obj.has_previous())
+
+    def test_cursor_pages_do_not_overlap(self):
+        """Курсоры вперёд, назад и на последнюю страницу согласованы."""
+        url = reverse('posts:index')
+        first_page = self.client.get(url).context['page_obj']
+        second_page = self.client.get(
+            url, {'after': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertFalse(
+            {post.pk for post in first_page}
+            & {post.pk for post in second_page}
+        )
+        previous_page = self.client.get(
+            url, {'before': second_page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(previous_page), list(first_page))
+        self.assertFalse(previous_page.has_previous())
+        last_page = self.client.get(url, {'last': 1}).context['page_obj']
+        self.assertEqual(list(last_page)[-3:], list(second_page))
+        self.assertFalse(last_page.has_next())
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор отдаёт первую страницу."""
+        response = self.client.get(
+            reverse('posts:index'), {'after': 'not-a-cursor'}
+        )
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_deep_page_costs_same_as_first(self):
+        """Страница по курсору выбирается одним запросом без COUNT и OFFSET."""
+        url = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        page_obj = self.client.get(url).context['page_obj']
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, {'after': page_obj.next_cursor})
+        feed_queries = [
+            query['sql'] for query in queries.captured_queries
+            if 'FROM "posts_post"' in query['sql']
+            and 'LIMIT 11' in query['sql']
+        ]
+        self.assertEqual(len(feed_queries), 1)
+        for query in queries.captured_queries:
+            self.assertNotIn('__count', query['sql'])
+            self.assertNotIn('OFFSET', query['sql'])
+
+    def test_numbered_second_page_contains_three_records(self):
+        """По ?page= лента листается нумерованными страницами."""
+        follower = User.objects.create_user(username='follower')
+        Follow.objects.create(user=follower, author=self.user)
+        client = Client()
+        client.force_login(follower)
+        arguments = {
+            'posts:index': None,
+            'posts:group_list': {'slug': 'test-slug'},
+            'posts:profile': {'username': 'V.Pupkin'},
+            'posts:follow_index': None,
+        }
+
+        for url, kwargs in arguments.items():
+            with self.subTest(url=url, kwargs=kwargs):
+                response = client.get(
+                    reverse(url, kwargs=kwargs), {'page': 2}
+                )
+                page_obj = response.context['page_obj']
+                self.assertEqual(len(page_obj), 3)
+                self.assertEqual(page_obj.number, 2)
+                self.assertEqual(page_obj.elided_page_range, [1, 2])
+                self.assertContains(response, '?page=1')
+
+    def test_numbered_pages_count_is_cached(self):
+        """Число постов считается один раз до смены версии ленты."""
+        cache.clear()
+        url = reverse('posts:index')
+        self.client.get(url, {'page': 1})
+        with CaptureQueriesContext(connection) as queries:
+            page_obj = self.client.get(url, {'page': 2}).context['page_obj']
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT', query['sql'])
+        self.assertEqual(page_obj.paginator.count, 13)
+        Post.objects.create(author=self.user, text='Новый пост')
+        page_obj = self.client.get(url, {'page': 2}).context['page_obj']
+        self.assertEqual(page_obj.paginator.count, 14)
+
+    def test_elided_page_range(self):
+        """Выводится только окно страниц вокруг текущей."""
+        paginator = CachedCountPaginator(range(200000), 10)
+        self.assertEqual(
+            list(paginator.get_elided_page_range(1)),
+            [1, 2, 3, ELLIPSIS, 20000],
+        )
+        self.assertEqual(
+            list(paginator.get_elided_page_range(5000)),
+            [1, ELLIPSIS, 4998, 4999, 5000, 5001, 5002, ELLIPSIS, 20000],
+        )
+        self.assertEqual(
+            list(paginator.get_elided_page_range(20000)),
+            [1, ELLIPSIS, 19998, 19999, 20000],
+        )
+
+
+class FeedQueriesTest(TestCase):
+    FEED_QUERIES = {
+        'posts:index': 1,
+        'posts:group_list': 2,
+        'posts:profile': 3,
+        'posts:follow_index': 3,
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(title='Заголовок', slug='test-slug')
+        cls.user = User.objects.create_user(username='V.Pupkin')
+        cls.follower = User.objects.create_user(username='Follower')
+        Follow.objects.create(user=cls.follower, author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.follower)
+
+    def feed_urls(self):
+        return {
+            'posts:index': reverse('posts:index'),
+            'posts:group_list': reverse(
+                'posts:group_list', kwargs={'slug': 'test-slug'}
+            ),
+            'posts:profile': reverse(
+                'posts:profile', kwargs={'username': 'V.Pupkin'}
+            ),
+            'posts:follow_index': reverse('posts:follow_index'),
+        }
+
+    def create_posts(self, count):
+        for number in range(count):
+            post = Post.objects.create(
+                author=self.user, group=self.group, text=f'Пост {number}'
+            )
+            Comment.objects.create(post=post, author=self.user, text='Ок')
+
+    def test_feed_query_count_does_not_depend_on_page_size(self):
+        """Число запросов ленты не зависит от числа постов на странице."""
+        # Сессия и пользователь запроса добавляют ещё два запроса.
+        self.create_posts(1)
+        for name, url in self.feed_urls().items():
+            with self.subTest(url=name):
+                cache.clear()
+                with self.assertNumQueries(self.FEED_QUERIES[name] + 2):
+                    self.client.get(url)
+        self.create_posts(9)
+        for name, url in self.feed_urls().items():
+            with self.subTest(url=name):
+                cache.clear()
+                with self.assertNumQueries(self.FEED_QUERIES[name] + 2):
+                    response = self.client.get(url)
+                self.assertEqual(len(response.context['page_obj']), 10)
+                self.assertEqual(
+                    response.context['page_obj'][0].comment_count, 1
+                )
+
+
+class PostCommentsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Author')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def add_comments(self, count):
+        # Разные авторы, чтобы поймать запрос автора на каждый комментарий.
+        for number in range(count):
+            author = User.objects.create_user(
+                username=f'reader{Comment.objects.count()}'
+            )
+            Comment.objects.create(
+                post=self.post, author=author, text=f'Комментарий {number}'
+            )
+
+    def get_detail(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('posts:post_detail', args=(self.post.pk,)), params
+            )
+        return response, len(queries)
+
+    def test_comments_are_paginated(self):
+        """Пост показывает первую страницу, фрагмент — следующую."""
+        self.add_comments(settings.COMMENTS_PAGE + 5)
+        response, _ = self.get_detail()
+        comments = response.context['comments']
+        self.assertEqual(len(comments), settings.COMMENTS_PAGE)
+        newest = Comment.objects.latest('created', 'pk')
+        self.assertEqual(comments[0], newest)
+        response = self.client.get(
+            reverse('posts:post_comments', args=(self.post.pk,)),
+            {'after': comments.next_cursor},
+        )
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        rest = response.context['comments']
+        self.assertEqual(len(rest), 5)
+        self.assertIsNone(rest.next_cursor)
+        self.assertFalse(set(comments) & set(rest))
+
+    def test_detail_query_count_does_not_depend_on_comments(self):
+        """Страница поста стоит одинаково при 5 и 50 комментариях."""
+        self.add_comments(5)
+        _, few = self.get_detail()
+        self.add_comments(45)
+        _, many = self.get_detail()
+        self.assertEqual(many, few)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(title='Группа', slug='test-slug')
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Пост'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def urls(self):
+        return {
+            'index': reverse('posts:index'),
+            'group_list': reverse('posts:group_list', args=('test-slug',)),
+            'profile': reverse('posts:profile', args=('Author',)),
+            'post_detail': reverse(
+                'posts:post_detail', args=(self.post.pk,)
+            ),
+        }
+
+    def test_not_modified_without_rendering(self):
+        """Повторный запрос с тем же ETag получает 304 без шаблона."""
+        # Сессия, пользователь и поиск группы, автора или поста по ключу.
+        for name, url in self.urls().items():
+            with self.subTest(view=name):
+                etag = self.client.get(url)['ETag']
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertFalse(response.templates)
+                self.assertLessEqual(len(queries), 3)
+
+    def test_etag_follows_content_and_viewer(self):
+        """Комментарий, подписка и смена зрителя дают новый ETag."""
+        etags = {name: self.client.get(url)['ETag']
+                 for name, url in self.urls().items()}
+        Comment.objects.create(post=self.post, author=self.reader, text='Ок')
+        Follow.objects.create(user=self.reader, author=self.user)
+        for name, url in self.urls().items():
+            with self.subTest(view=name):
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[name]
+                )
+                self.assertEqual(response.status_code, 200)
+                etags[name] = response['ETag']
+        self.client.force_login(self.user)
+        for name, url in self.urls().items():
+            with self.subTest(view=name):
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[name]
+                )
+                self.assertEqual(response.status_code, 200)
@@ -0,0 +1,249 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+Варианты картинки всех ширин POST_IMAGE_WIDTHS и форматов
+POST_IMAGE_FORMATS строятся в пуле процессов сразу после сохранения
+картинки поста и лежат рядом с оригиналом. Тег {% thumbnail %}
+только ищет готовую миниатюру в хранилище ключей sorl и, пока её нет,
+отдаёт исходную картинку: запрос никогда не декодирует изображение.
+Ленты заранее находят миниатюры всей страницы одним чтением
+(prefetch_thumbnails), а не по одному запросу на пост.
+"""
+import logging
+import os
+from collections import namedtuple
+
+from django.conf import settings
+from django.utils import timezone
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.helpers import serialize, tokey
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    KVStore as CachedDBKVStore,
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import background
+from .caching import bump_post_feeds
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {
+    'AVIF': 'avif',
+    'WEBP': 'webp',
+    'JPEG': 'jpg',
+    'PNG': 'png',
+}
+CONTENT_TYPES = {
+    'AVIF': 'image/avif',
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+}
+
+Variant = namedtuple('Variant', 'format width geometry options')
+# Отметка промаха в кеше хранилища ключей.
+MISS = ''
+
+
+class KVStore(CachedDBKVStore):
+    """Хранилище cached_db с коротким кешем промахов.
+
+    Миниатюры пишут процессы пула, и запись перекрывает промах в общем
+    кеше. Промах живёт не дольше THUMBNAIL_MISS_TIMEOUT, поэтому
+    построенная миниатюра появится и при кеше в памяти процесса.
+    """
+
+    def _get_raw(self, key):
+        value = self.cache.get(key)
+        if value is None:
+            value = KVStoreModel.objects.filter(key=key).values_list(
+                'value', flat=True
+            ).first()
+            if value is None:
+                self.cache.set(key, MISS, settings.THUMBNAIL_MISS_TIMEOUT)
+                return None
+            self.cache.set(key, value, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        return value or None
+
+    def get_many(self, image_files):
+        """Записи картинок одним чтением кеша и одним запросом к базе.
+
+        Возвращает словарь {ключ картинки: ImageFile} только для
+        найденных записей.
+        """
+        keys = {add_prefix(image_file.key): image_file.key
+                for image_file in image_files}
+        values = self.cache.get_many(list(keys))
+        missing = [key for key in keys if key not in values]
+        if missing:
+            found = dict(
+                KVStoreModel.objects.filter(key__in=missing).values_list(
+                    'key', 'value'
+                )
+            )
+            self.cache.set_many(
+                found, sorl_settings.THUMBNAIL_CACHE_TIMEOUT
+            )
+            self.cache.set_many(
+                {key: MISS for key in missing if key not in found},
+                settings.THUMBNAIL_MISS_TIMEOUT,
+            )
+            values.update(found)
+        return {
+            keys[key]: deserialize_image_file(value)
+            for key, value in values.items() if value
+        }
+
+
+def image_formats():
+    """Форматы из POST_IMAGE_FORMATS, которые умеет сохранять Pillow."""
+    Image.init()
+    return [
+        format_ for format_ in settings.POST_IMAGE_FORMATS
+        if format_ in Image.SAVE
+    ]
+
+
+def picture_variants():
+    """Все варианты картинки поста: каждый формат в каждой ширине."""
+    width, height = settings.POST_IMAGE_SIZE
+    return [
+        Variant(
+            format_,
+            variant_width,
+            f'{variant_width}x{round(variant_width * height / width)}',
+            {'crop': 'center', 'upscale': True, 'format': format_},
+        )
+        for format_ in image_formats()
+        for variant_width in settings.POST_IMAGE_WIDTHS
+    ]
+
+
+class DeferredThumbnailBackend(ThumbnailBackend):
+    """Отдаёт готовую миниатюру или исходную картинку, ничего не строя.
+
+    Миниатюры называются по оригиналу и лежат рядом с ним:
+    posts/cat.jpg -> posts/cat-960x339-1a2b3c4d.webp.
+    """
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        key = tokey(source.key, geometry_string, serialize(options))
+        stem = os.path.splitext(source.name)[0]
+        extension = EXTENSIONS[options['format']]
+        return f'{stem}-{geometry_string}-{key[:8]}.{extension}'
+
+    def _thumbnail_file(self, source, geometry_string, options):
+        # Те же параметры по умолчанию, что в ThumbnailBackend.get_thumbnail,
+        # чтобы имя миниатюры совпало с построенной в пуле.
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        source = ImageFile(file_)
+        thumbnail = self._thumbnail_file(source, geometry_string, options)
+        prefetched = getattr(file_, 'prefetched_thumbnails', {})
+        if thumbnail.key in prefetched:
+            return prefetched[thumbnail.key] or source
+        return default.kvstore.get(thumbnail) or source
+
+    def prefetch(self, files):
+        """Находит готовые варианты картинок всех файлов сразу.
+
+        Результат, в том числе промахи, запоминается в самих файлах,
+        и get_thumbnail для них не обращается к хранилищу ключей.
+        """
+        wanted = []
+        for file_ in files:
+            source = ImageFile(file_)
+            file_.prefetched_thumbnails = {}
+            for variant in picture_variants():
+                thumbnail = self._thumbnail_file(
+                    source, variant.geometry, dict(variant.options)
+                )
+                wanted.append((file_, thumbnail))
+        if not wanted:
+            return
+        found = default.kvstore.get_many(
+            thumbnail for file_, thumbnail in wanted
+        )
+        for file_, thumbnail in wanted:
+            file_.prefetched_thumbnails[thumbnail.key] = found.get(
+                thumbnail.key
+            )
+
+    def generate(self, file_, geometry_string, **options):
+        """Строит миниатюру, если её ещё нет."""
+        return super().get_thumbnail(file_, geometry_string, **options)
+
+
+def prefetch_thumbnails(posts):
+    """Готовые миниатюры картинок постов одним чтением на страницу."""
+    default.backend.prefetch([post.image for post in posts if post.image])
+
+
+def picture(image):
+    """Источники для <picture> из готовых вариантов картинки.
+
+    Последний поддерживаемый формат идёт в <img>, остальные
+    в <source>. Пока вариантов нет, <img> показывает оригинал.
+    """
+    srcsets = {}
+    src = image.url
+    width = settings.POST_IMAGE_SIZE[0]
+    fallback = image_formats()[-1]
+    for variant in picture_variants():
+        thumbnail = default.backend.get_thumbnail(
+            image, variant.geometry, **variant.options
+        )
+        if thumbnail.name == image.name:
+            continue
+        srcsets.setdefault(variant.format, []).append(
+            f'{thumbnail.url} {variant.width}w'
+        )
+        if variant.format == fallback and variant.width == width:
+            src = thumbnail.url
+    return {
+        'sources': [
+            (CONTENT_TYPES[format_], ', '.join(srcset))
+            for format_, srcset in srcsets.items() if format_ != fallback
+        ],
+        'src': src,
+        'srcset': ', '.join(srcsets.get(fallback, [])),
+    }
+
+
+def pregenerate(name):
+    """Строит все варианты картинки name в текущем процессе.
+
+    Отметка modified постов с этой картинкой сдвигается, чтобы
+    закешированные карточки перешли с оригинала на варианты, а версии
+    их лент — чтобы сменились ETag страниц.
+    """
+    for variant in picture_variants():
+        default.backend.generate(name, variant.geometry, **variant.options)
+    posts = Post.objects.filter(image=name)
+    posts.update(modified=timezone.now())
+    for post in posts.only('author_id', 'group_id'):
+        bump_post_feeds(post)
+    return name
+
+
+def schedule(name):
+    """После коммита строит миниатюры name в фоновом пуле."""
+    background.submit(pregenerate, name)
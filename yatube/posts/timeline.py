@@ -0,0 +1,267 @@
+"""Лента подписок с гибридной раскладкой постов.
+
+Посты обычных авторов раскладываются по лентам подписчиков при записи.
+Посты авторов, у которых по счётчику профиля подписчиков больше
+settings.TIMELINE_FANOUT_THRESHOLD, не раскладываются: при чтении ленты
+они подмешиваются из кешированных списков последних постов автора.
+Такой автор помечается Profile.fanout_paused; когда подписчиков
+становится не больше порога, его посты дописываются в ленты в фоне.
+"""
+from collections import defaultdict
+from itertools import chain, islice
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import background
+from .models import Follow, Post, Profile, TimelineEntry
+from .utils import (
+    CursorPaginator, get_cursor_page, paginate, wants_page_numbers,
+)
+
+RECENT_POSTS_KEY = 'timeline:recent:{}'
+
+
+def is_hot(followers):
+    return followers > settings.TIMELINE_FANOUT_THRESHOLD
+
+
+def follower_count(author_id):
+    """Число подписчиков автора по счётчику профиля."""
+    counts = Profile.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True
+    )
+    return next(iter(counts), 0)
+
+
+def hot_authors(user):
+    """Популярные авторы среди подписок: их посты не раскладываются."""
+    return list(Follow.objects.filter(
+        user=user,
+        author__profile__followers_count__gt=(
+            settings.TIMELINE_FANOUT_THRESHOLD
+        ),
+    ).values_list('author_id', flat=True))
+
+
+def recent_posts(author_ids):
+    """Последние посты авторов как пары (pub_date, id)."""
+    keys = {RECENT_POSTS_KEY.format(author_id): author_id
+            for author_id in author_ids}
+    recent = {
+        keys[key]: posts for key, posts in cache.get_many(keys).items()
+    }
+    fresh = {}
+    for author_id in author_ids:
+        if author_id not in recent:
+            fresh[author_id] = list(
+                Post.objects.filter(author_id=author_id).order_by(
+                    '-pub_date', '-pk'
+                ).values_list(
+                    'pub_date', 'pk'
+                )[:settings.TIMELINE_RECENT_POSTS]
+            )
+    if fresh:
+        cache.set_many(
+            {RECENT_POSTS_KEY.format(author_id): posts
+             for author_id, posts in fresh.items()},
+            settings.TIMELINE_CACHE_TIMEOUT,
+        )
+        recent.update(fresh)
+    return list(chain.from_iterable(recent.values()))
+
+
+def forget_recent_posts(author_id):
+    cache.delete(RECENT_POSTS_KEY.format(author_id))
+
+
+def _insert(entries):
+    """Пишет записи ленты пачками, не собирая их все в памяти."""
+    while True:
+        batch = list(islice(entries, settings.TIMELINE_BATCH_SIZE))
+        if not batch:
+            return
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def _backfill(user_id, author_id):
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('pk', 'pub_date')
+    _insert(
+        TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+        for pk, pub_date in posts.iterator()
+    )
+
+
+def pause_fanout(author_ids):
+    """Запоминает, что у авторов есть посты без раскладки."""
+    Profile.objects.filter(
+        user_id__in=author_ids, fanout_paused=False
+    ).update(fanout_paused=True)
+
+
+def fan_out(post):
+    """Кладёт новый пост в ленты всех подписчиков автора."""
+    forget_recent_posts(post.author_id)
+    if is_hot(follower_count(post.author_id)):
+        pause_fanout([post.author_id])
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id, user__isnull=False
+    ).values_list('user_id', flat=True)
+    _insert(
+        TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def fan_out_many(posts):
+    """Раскладывает по лентам пачку постов, записанных bulk_create."""
+    by_author = defaultdict(list)
+    for post in posts:
+        by_author[post.author_id].append(post)
+    cache.delete_many(
+        [RECENT_POSTS_KEY.format(author_id) for author_id in by_author]
+    )
+    hot = list(Profile.objects.filter(
+        user_id__in=by_author,
+        followers_count__gt=settings.TIMELINE_FANOUT_THRESHOLD,
+    ).values_list('user_id', flat=True))
+    pause_fanout(hot)
+    followers = Follow.objects.filter(
+        author_id__in=set(by_author) - set(hot), user__isnull=False
+    ).values_list('author_id', 'user_id')
+    _insert(
+        TimelineEntry(user_id=user_id, post_id=post.pk, pub_date=post.pub_date)
+        for author_id, user_id in followers.iterator()
+        for post in by_author[author_id]
+    )
+
+
+def backfill(follow):
+    """Добавляет в ленту подписчика уже опубликованные посты автора."""
+    if follow.user_id is None or follow.author_id is None:
+        return
+    if is_hot(follower_count(follow.author_id)):
+        return
+    _backfill(follow.user_id, follow.author_id)
+
+
+def prune(follow):
+    """Убирает посты автора из ленты бывшего подписчика.
+
+    Если после отписки автор не выше порога, а его посты раньше
+    публиковались без раскладки, они дописываются в ленты в фоне.
+    """
+    if follow.user_id is None or follow.author_id is None:
+        return
+    TimelineEntry.objects.filter(
+        user_id=follow.user_id, post__author_id=follow.author_id
+    ).delete()
+    # Сравнение <=: массовое удаление подписок проскакивает порог.
+    resumed = Profile.objects.filter(
+        user_id=follow.author_id,
+        fanout_paused=True,
+        followers_count__lte=settings.TIMELINE_FANOUT_THRESHOLD,
+    ).update(fanout_paused=False)
+    if resumed:
+        background.submit(backfill_followers, follow.author_id)
+
+
+def backfill_followers(author_id):
+    """Дописывает все посты автора в ленты всех его подписчиков."""
+    user_ids = Follow.objects.filter(
+        author_id=author_id, user__isnull=False
+    ).values_list('user_id', flat=True)
+    for user_id in user_ids.iterator():
+        _backfill(user_id, author_id)
+
+
+def resume_cooled_authors():
+    """Дописывает ленты авторов, опустившихся до порога без сигналов.
+
+    Так бывает после правки счётчиков или смены порога; вызывается
+    из repair_counters. Возвращает число авторов.
+    """
+    author_ids = list(Profile.objects.filter(
+        fanout_paused=True,
+        followers_count__lte=settings.TIMELINE_FANOUT_THRESHOLD,
+    ).values_list('user_id', flat=True))
+    for author_id in author_ids:
+        Profile.objects.filter(user_id=author_id).update(
+            fanout_paused=False
+        )
+        backfill_followers(author_id)
+    return len(author_ids)
+
+
+class TimelinePaginator(CursorPaginator):
+    """Курсорный пагинатор ленты с подмешиванием постов популярных авторов.
+
+    extra — записи ленты, собранные при чтении; в выдачу попадают те,
+    что лежат по нужную сторону от курсора.
+    """
+    key = ('pub_date', 'post_id')
+
+    def __init__(self, object_list, per_page, extra=()):
+        super().__init__(object_list, per_page)
+        self.extra = extra
+
+    def _rows(self, after, before, backwards, limit):
+        rows = super()._rows(after, before, backwards, limit)
+        if not self.extra:
+            return rows
+
+        def position(entry):
+            return entry.pub_date, entry.post_id
+
+        extra = self.extra
+        if after:
+            extra = [entry for entry in extra if position(entry) < after]
+        elif before:
+            extra = [entry for entry in extra if position(entry) > before]
+        merged = {entry.post_id: entry for entry in chain(extra, rows)}
+        return sorted(
+            merged.values(), key=position, reverse=not backwards
+        )[:limit]
+
+
+def timeline_cursor_page(request, user):
+    """Страница ленты подписок по курсору, object_list — id постов.
+
+    Диапазон берётся по индексу (user, pub_date), посты популярных
+    авторов подмешиваются из кеша.
+    """
+    extra = [
+        TimelineEntry(user=user, post_id=pk, pub_date=pub_date)
+        for pub_date, pk in recent_posts(hot_authors(user))
+    ]
+    paginator = TimelinePaginator(
+        TimelineEntry.objects.filter(user=user),
+        settings.PAGINATOR_PAGE,
+        extra,
+    )
+    page = get_cursor_page(request, paginator)
+    page.object_list = [entry.post_id for entry in page.object_list]
+    return page
+
+
+def timeline_page(request, user):
+    """Страница ленты подписок.
+
+    Курсоры совпадают с курсорами ленты постов, поэтому шаблон
+    пагинации общий для всех лент. Нумерованные страницы строятся
+    по подпискам напрямую, а их число живёт в кеше только по таймауту.
+    """
+    if wants_page_numbers(request):
+        post_list = Post.objects.for_feed().filter(
+            author__following__user=user
+        )
+        return paginate(request, post_list, count_key=('follow', user.pk))
+    page = timeline_cursor_page(request, user)
+    # Порядок уже задан лентой, сортировка в базе не нужна.
+    post_ids = page.object_list
+    posts = Post.objects.for_feed().order_by().in_bulk(post_ids)
+    page.object_list = [posts[pk] for pk in post_ids if pk in posts]
+    return page
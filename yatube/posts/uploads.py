@@ -0,0 +1,130 @@
+"""Загрузка картинок постов с ограниченной памятью.
+
+Файл пишется во временный файл кусками (LimitedTemporaryFileUploadHandler)
+и не больше POST_IMAGE_MAX_BYTES. Размеры картинки проверяются по
+заголовку до декодирования, затем prepare_image уменьшает её до
+POST_IMAGE_MAX_SIDE через draft-режим Pillow и сохраняет без EXIF.
+
+Пик памяти воркера на одну загрузку ограничен POST_UPLOAD_MAX_RSS:
+декодируется не больше POST_IMAGE_MAX_PIXELS пикселей, а JPEG сразу
+в уменьшенном масштабе.
+"""
+import io
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, ImageOps
+
+EXIF_ORIENTATION = 0x0112
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 90, 'optimize': True},
+    'PNG': {'optimize': True},
+}
+# Формат для картинок, которые Pillow читает, но не пишет (PSD и т. п.).
+FALLBACK_FORMATS = {
+    'PNG': ('.png', 'image/png'),
+    'JPEG': ('.jpg', 'image/jpeg'),
+}
+# Из image.info при сохранении остаётся только прозрачность.
+KEPT_INFO = ('transparency',)
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Пишет файл на диск кусками и отбрасывает всё сверх лимита.
+
+    Обрезанный файл помечается too_large, форма его отклоняет.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.too_large = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_BYTES:
+            self.too_large = True
+            return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.too_large = self.too_large
+        return upload
+
+
+def fitted_size(size, side):
+    """Размер, вписанный в квадрат side×side с сохранением пропорций."""
+    width, height = size
+    scale = min(1, side / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def open_image(upload):
+    """Открывает картинку без декодирования.
+
+    JPEG переводится в draft-режим и будет декодирован сразу
+    в масштабе 1/2, 1/4 или 1/8, поэтому image.size — размер
+    будущего растра в памяти.
+    """
+    upload.seek(0)
+    image = Image.open(upload)
+    image.draft(
+        image.mode,
+        fitted_size(image.size, settings.POST_IMAGE_MAX_SIDE),
+    )
+    return image
+
+
+def check_image(upload):
+    """Отклоняет слишком большой файл или картинку по заголовку."""
+    if getattr(upload, 'too_large', False):
+        raise ValidationError(
+            'Файл больше %(limit)d МБ.',
+            code='file_too_large',
+            params={'limit': settings.POST_IMAGE_MAX_BYTES // 2 ** 20},
+        )
+    with open_image(upload) as image:
+        width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка слишком большая, уменьшите её до %(limit)d Мп.',
+            code='image_too_large',
+            params={'limit': settings.POST_IMAGE_MAX_PIXELS // 10 ** 6},
+        )
+
+
+def prepare_image(upload):
+    """Уменьшенная копия картинки без метаданных.
+
+    Имя и тип файла прежние, кроме форматов, которые Pillow
+    не умеет сохранять: они сохраняются в PNG или JPEG.
+    """
+    name = os.path.basename(upload.name)
+    content_type = upload.content_type
+    with open_image(upload) as image:
+        format_ = image.format
+        image.thumbnail(fitted_size(image.size, settings.POST_IMAGE_MAX_SIDE))
+        # Поворот по EXIF делается уже на уменьшенной копии и только
+        # когда он нужен: exif_transpose всегда копирует растр.
+        if image.getexif().get(EXIF_ORIENTATION, 1) != 1:
+            image = ImageOps.exif_transpose(image)
+        if format_ not in Image.SAVE:
+            format_ = 'PNG' if 'A' in image.getbands() else 'JPEG'
+            if format_ == 'JPEG' and image.mode not in ('RGB', 'L', 'CMYK'):
+                image = image.convert('RGB')
+            extension, content_type = FALLBACK_FORMATS[format_]
+            name = os.path.splitext(name)[0] + extension
+        # PNG и WebP берут EXIF и ICC из image.info, если их не передать.
+        image.info = {
+            key: value for key, value in image.info.items()
+            if key in KEPT_INFO
+        }
+        output = io.BytesIO()
+        image.save(
+            output, format_, exif=b'', **SAVE_OPTIONS.get(format_, {})
+        )
+    return SimpleUploadedFile(name, output.getvalue(), content_type)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import feeds, views
 
 app_name = 'posts'
 
@@ -19,11 +19,39 @@ urlpatterns = [
         views.profile,
         name='profile',
     ),
+    path('search/', views.search, name='search'),
+    path('rss/', feeds.LatestPostsFeed(), name='index_rss'),
+    path('atom/', feeds.LatestPostsAtomFeed(), name='index_atom'),
+    path(
+        'group/<slug:slug>/rss/',
+        feeds.GroupPostsFeed(),
+        name='group_rss',
+    ),
+    path(
+        'group/<slug:slug>/atom/',
+        feeds.GroupPostsAtomFeed(),
+        name='group_atom',
+    ),
+    path(
+        'profile/<str:username>/rss/',
+        feeds.AuthorPostsFeed(),
+        name='profile_rss',
+    ),
+    path(
+        'profile/<str:username>/atom/',
+        feeds.AuthorPostsAtomFeed(),
+        name='profile_atom',
+    ),
     path(
         'posts/<int:post_id>/',
         views.post_detail,
         name='post_detail',
     ),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments',
+    ),
     path(
         'posts/<int:post_id>/edit/',
         views.post_edit,
@@ -46,6 +74,7 @@ urlpatterns = [
         name='comment_delete',
     ),
     path('follow/', views.follow_index, name='follow_index'),
+    path('export/', views.export, name='export'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
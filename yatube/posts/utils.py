@@ -0,0 +1,217 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+ELLIPSIS = '…'
+
+
+def encode_cursor(obj, key=('pub_date', 'pk')):
+    """Непрозрачный токен позиции объекта в ленте (pub_date, id).
+
+    obj — модель или строка values() с полями key.
+    """
+    date_field, id_field = key
+    if isinstance(obj, dict):
+        date, pk = obj[date_field], obj[id_field]
+    else:
+        date, pk = getattr(obj, date_field), getattr(obj, id_field)
+    raw = f'{date.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Разбирает токен курсора, для битого токена возвращает None."""
+    if not token:
+        return None
+    try:
+        padding = '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(token + padding).decode()
+        pub_date, pk = raw.split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинатор по (pub_date, id) без COUNT(*) и OFFSET.
+
+    Каждая страница выбирается одним запросом с LIMIT per_page + 1
+    от позиции курсора, поэтому глубокие страницы стоят столько же,
+    сколько первая. Номера страниц неизвестны: page.number равен 1
+    для первой страницы и 2 для любой следующей, а num_pages отражает
+    только наличие соседних страниц.
+
+    key задаёт имена полей даты и идентификатора, по которым
+    упорядочена лента.
+    """
+    key = ('pub_date', 'pk')
+
+    def __init__(self, object_list, per_page, key=None):
+        super().__init__(object_list, per_page)
+        if key is not None:
+            self.key = key
+        self._num_pages = 1
+
+    def _check_object_list_is_ordered(self):
+        # Порядок по ключу задаётся в get_page.
+        pass
+
+    def _seek(self, queryset, cursor, direction):
+        # Условие вида pub_date <= X AND (pub_date < X OR id < Y):
+        # первая часть даёт диапазон по индексу, OR только фильтрует.
+        date_field, id_field = self.key
+        pub_date, pk = cursor
+        return queryset.filter(
+            Q(**{f'{date_field}__{direction}e': pub_date}),
+            Q(**{f'{date_field}__{direction}': pub_date})
+            | Q(**{f'{id_field}__{direction}': pk}),
+        )
+
+    @property
+    def num_pages(self):
+        return self._num_pages
+
+    def encode(self, obj):
+        return encode_cursor(obj, self.key)
+
+    def decode(self, token):
+        return decode_cursor(token)
+
+    def _rows(self, after, before, backwards, limit):
+        """Первые limit объектов ленты от курсора в нужную сторону."""
+        date_field, id_field = self.key
+        queryset = self.object_list
+        if after:
+            queryset = self._seek(queryset, after, 'lt')
+        elif before:
+            queryset = self._seek(queryset, before, 'gt')
+        if backwards:
+            queryset = queryset.order_by(date_field, id_field)
+        else:
+            queryset = queryset.order_by(f'-{date_field}', f'-{id_field}')
+        return list(queryset[:limit])
+
+    def get_page(self, after=None, before=None, last=False):
+        after = self.decode(after)
+        before = self.decode(before)
+        backwards = not after and (before or last)
+        rows = self._rows(after, before, backwards, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            if not has_more:
+                # Дошли до начала ленты: показываем полную первую страницу.
+                return self.get_page()
+            rows.reverse()
+            has_previous, has_next = True, bool(before)
+        else:
+            has_previous, has_next = bool(after), has_more
+        number = 2 if has_previous else 1
+        self._num_pages = number + 1 if has_next else number
+        page = Page(rows, number, self)
+        page.next_cursor = (
+            self.encode(rows[-1]) if has_next and rows else None
+        )
+        page.previous_cursor = (
+            self.encode(rows[0]) if has_previous and rows else None
+        )
+        return page
+
+
+class CachedCountPaginator(Paginator):
+    """Нумерованный пагинатор с кешированным числом объектов.
+
+    Число объектов берётся из count, если оно уже известно (например,
+    из счётчика профиля), иначе из кеша по count_key. В ключ стоит
+    включать версию ленты, тогда новое число считается после её смены.
+    Ссылки на страницы строятся окном вокруг текущей.
+    """
+    ELLIPSIS = ELLIPSIS
+
+    def __init__(self, object_list, per_page, count_key=None, count=None):
+        super().__init__(object_list, per_page)
+        self.count_key = count_key
+        self._known_count = count
+
+    @cached_property
+    def count(self):
+        if self._known_count is not None:
+            return self._known_count
+        if self.count_key is None:
+            return super().count
+        key = 'feed-count:' + ':'.join(str(part) for part in self.count_key)
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, settings.PAGINATOR_COUNT_TIMEOUT)
+        return count
+
+    def get_elided_page_range(self, number=1, on_each_side=2, on_ends=1):
+        """Номера страниц вокруг текущей и по краям, пропуски — ELLIPSIS."""
+        number = self.validate_number(number)
+        num_pages = self.num_pages
+        if num_pages <= (on_each_side + on_ends) * 2 + 1:
+            yield from range(1, num_pages + 1)
+            return
+        if number > 1 + on_each_side + on_ends + 1:
+            yield from range(1, on_ends + 1)
+            yield ELLIPSIS
+            start = number - on_each_side
+        else:
+            start = 1
+        if number < num_pages - on_each_side - on_ends - 1:
+            yield from range(start, number + on_each_side + 1)
+            yield ELLIPSIS
+            yield from range(num_pages - on_ends + 1, num_pages + 1)
+        else:
+            yield from range(start, num_pages + 1)
+
+    def get_page(self, number):
+        page = super().get_page(number)
+        page.elided_page_range = list(
+            self.get_elided_page_range(page.number)
+        )
+        return page
+
+
+def wants_page_numbers(request):
+    """Нумерованные страницы по ?page= или по умолчанию из настроек."""
+    if 'page' in request.GET:
+        return True
+    cursor_params = ('after', 'before', 'last')
+    if any(param in request.GET for param in cursor_params):
+        return False
+    return settings.FEED_PAGE_NUMBERS
+
+
+def get_cursor_page(request, paginator):
+    """Страница пагинатора по курсорам ?after=, ?before= и ?last=."""
+    return paginator.get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        last=bool(request.GET.get('last')),
+    )
+
+
+def paginate(request, post_list, count_key=None, count=None):
+    """Страница ленты постов: по курсору или по номеру страницы."""
+    if wants_page_numbers(request):
+        paginator = CachedCountPaginator(
+            post_list.order_by('-pub_date', '-pk'),
+            settings.PAGINATOR_PAGE,
+            count_key,
+            count,
+        )
+        return paginator.get_page(request.GET.get('page'))
+    paginator = CursorPaginator(post_list, settings.PAGINATOR_PAGE)
+    return get_cursor_page(request, paginator)
@@ -1,52 +1,111 @@
-from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
-from django.core.paginator import Paginator
 from .models import Follow, Post, Group, User, Comment
+from . import counters
+from .caching import feed_cache, feed_version, page_etag
+from .export import FORMATS, export_lines
 from .forms import PostForm, CommentForm
+from .search import search_page
+from .timeline import timeline_page
+from .utils import CursorPaginator, paginate
+from django.conf import settings
 from django.shortcuts import redirect
 from django.urls import reverse
+from django.utils.http import urlencode
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
+
 
+def page_object(request, queryset, **lookup):
+    """Главный объект страницы: ETag и представление делят один запрос."""
+    if not hasattr(request, '_page_object'):
+        try:
+            request._page_object = queryset.get(**lookup)
+        except queryset.model.DoesNotExist:
+            request._page_object = None
+    return request._page_object
+
+
+def index_etag(request):
+    return page_etag(
+        request, feed_version('index'), feed_version('comments')
+    )
 
 
+@condition(etag_func=index_etag)
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, settings.PAGINATOR_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.for_feed()
+    cache_params = feed_cache('index')
+    page_obj = paginate(
+        request, post_list, count_key=('index', cache_params['version'])
+    )
     template = 'posts/index.html'
     title = 'Последние обновления на сайте'
-    comments = Comment.objects.all()
-
-
     context = {
         'page_obj': page_obj,
         'title': title,
-        'comments': comments,
+        'feed_cache': cache_params,
     }
     return render(request, template, context)
 
 
+def group_etag(request, slug):
+    group = page_object(request, Group.objects.all(), slug=slug)
+    if group is None:
+        return None
+    return page_etag(
+        request, feed_version('group', group.pk), feed_version('comments')
+    )
+
+
+@condition(etag_func=group_etag)
 def group_posts(request, slug):
     template = 'posts/group_list.html'
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, settings.PAGINATOR_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    group = page_object(request, Group.objects.all(), slug=slug)
+    if group is None:
+        raise Http404
+    post_list = group.posts.for_feed()
+    cache_params = feed_cache('group', group.pk)
+    page_obj = paginate(
+        request,
+        post_list,
+        count_key=('group', group.pk, cache_params['version']),
+    )
     context = {'group': group,
                'page_obj': page_obj,
+               'feed_cache': cache_params,
                }
     return render(request, template, context)
 
 
+def profile_etag(request, username):
+    author = page_object(
+        request, User.objects.select_related('profile'), username=username
+    )
+    if author is None:
+        return None
+    return page_etag(
+        request,
+        feed_version('author', author.pk),
+        feed_version('follows', author.pk),
+        feed_version('comments'),
+    )
+
+
+@condition(etag_func=profile_etag)
 def profile(request, username):
-    profile = get_object_or_404(User, username=username)
-    profile_posts = profile.posts.all()
-    paginator = Paginator(profile_posts, settings.PAGINATOR_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    profile = page_object(
+        request, User.objects.select_related('profile'), username=username
+    )
+    if profile is None:
+        raise Http404
+    profile_posts = profile.posts.for_feed()
+    page_obj = paginate(
+        request, profile_posts,
+        count=counters.ensure_profile(profile).posts_count,
+    )
     following = (
         request.user.is_authenticated
         and (Follow.objects.filter(user=request.user, author=profile).exists())
@@ -55,18 +114,59 @@ def profile(request, username):
         'author': profile,
         'page_obj': page_obj,
         'following': following,
+        'feed_cache': feed_cache('author', profile.pk),
     }
     return render(request, 'posts/profile.html', context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = search_page(request, query) if query else None
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'extra_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def comments_page(request, post_id):
+    """Комментарии поста от новых к старым, страница по курсору ?after=."""
+    comments = Comment.objects.filter(post_id=post_id).select_related('author')
+    paginator = CursorPaginator(
+        comments, settings.COMMENTS_PAGE, key=('created', 'pk')
+    )
+    return paginator.get_page(after=request.GET.get('after'))
+
+
+def post_detail_etag(request, post_id):
+    # modified сдвигают и правка поста, и комментарии к нему.
+    post = page_object(
+        request, Post.objects.select_related('author__profile', 'group'),
+        pk=post_id,
+    )
+    if post is None:
+        return None
+    return page_etag(
+        request,
+        post.modified.isoformat(),
+        feed_version('author', post.author_id),
+        post.group_id and feed_version('group', post.group_id),
+    )
+
+
+@condition(etag_func=post_detail_etag)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    author_posts = post.author.posts
+    post = page_object(
+        request, Post.objects.select_related('author__profile', 'group'),
+        pk=post_id,
+    )
+    if post is None:
+        raise Http404
     comment_form = CommentForm()
-    comments = Comment.objects.filter(post=post)
+    comments = comments_page(request, post_id)
     is_edit = request.user == post.author
     context = {'post': post,
-               'author_posts': author_posts,
                'comment': comment_form,
                'comments': comments,
                'is_edit': is_edit,
@@ -74,6 +174,14 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    """Фрагмент со следующей страницей комментариев для «Показать ещё»."""
+    context = {'comments': comments_page(request, post_id),
+               'post_id': post_id,
+               }
+    return render(request, 'posts/includes/comments.html', context)
+
+
 @login_required
 def post_create(request):
     if request.method != 'POST':
@@ -144,15 +252,12 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, settings.PAGINATOR_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = timeline_page(request, request.user)
     title = 'Мои подписки'
     return render(
         request,
         'posts/follow.html',
-        {'page_obj': page, 'paginator': paginator, 'title': title}
+        {'page_obj': page, 'paginator': page.paginator, 'title': title}
     )
 
 
@@ -171,3 +276,22 @@ def profile_unfollow(request, username):
     if profile_follow.exists():
         profile_follow.delete()
     return redirect('posts:profile', username=username)
+
+
+@login_required
+def export(request):
+    """Выгрузка своих постов и комментариев потоком NDJSON или CSV."""
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in FORMATS:
+        return HttpResponseBadRequest('Формат: ndjson или csv')
+
+    def image_url(name):
+        return request.build_absolute_uri(default_storage.url(name))
+
+    response = StreamingHttpResponse(
+        export_lines(request.user, export_format, image_url),
+        content_type=FORMATS[export_format],
+    )
+    filename = f'{request.user.username}.{export_format}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
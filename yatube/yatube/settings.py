@@ -10,11 +10,19 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# Запуск тестов: manage.py test или pytest. Тестам нужны свои кеш и
+# файлы, чтобы не трогать запущенный рядом сервер
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
@@ -61,10 +69,10 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
     'sorl.thumbnail',
-    'debug_toolbar',
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -72,14 +80,17 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+if DEBUG:
+    INSTALLED_APPS += ['debug_toolbar']
+    MIDDLEWARE += ['debug_toolbar.middleware.DebugToolbarMiddleware']
+
 ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.metrics.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -152,11 +163,113 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 PAGINATOR_PAGE = 10
+# Комментариев на странице поста и в каждой подгрузке
+COMMENTS_PAGE = 20
+# Ленты листаются курсорами; True включает нумерованные страницы
+# по умолчанию, ?page= включает их для отдельного запроса
+FEED_PAGE_NUMBERS = False
+# Сколько хранить число постов ленты для нумерованных страниц
+PAGINATOR_COUNT_TIMEOUT = 60 * 10
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Фрагменты, версии лент и записи RSS сбрасываются сигналами, а этот
+# срок ограничивает, сколько видны старыми записи в обход сигналов
+# (queryset.update(), загрузка без save)
+FEED_CACHE_TIMEOUT = 60 * 15
+# Записей в RSS и Atom лентах сайта, групп и авторов
+SYNDICATION_ITEMS = 20
+# Строк за один запрос к базе при потоковой выгрузке аккаунта
+EXPORT_CHUNK_SIZE = 500
+
+# Варианты картинки поста строятся заранее в пуле процессов: кадр
+# POST_IMAGE_SIZE в каждой ширине и в каждом формате, который умеет
+# сохранять Pillow. Форматы по убыванию предпочтения, последний идёт
+# в <img> для старых браузеров.
+POST_IMAGE_SIZE = (960, 339)
+POST_IMAGE_WIDTHS = [480, 960, 1440]
+POST_IMAGE_FORMATS = ['AVIF', 'WEBP', 'JPEG']
+THUMBNAIL_WORKERS = 2
+# Процессов в пуле фоновых задач, см. posts/background.py; при 0 задачи
+# выполняются в текущем процессе сразу после коммита
+BACKGROUND_WORKERS = 2
+# Промах по миниатюре кешируется ненадолго: её может построить пул
+THUMBNAIL_MISS_TIMEOUT = 60
+THUMBNAIL_BACKEND = 'posts.thumbnails.DeferredThumbnailBackend'
+THUMBNAIL_KVSTORE = 'posts.thumbnails.KVStore'
+
+# Загрузка картинок идёт кусками во временный файл, см. posts/uploads.py.
+# Файл больше POST_IMAGE_MAX_BYTES и растр больше POST_IMAGE_MAX_PIXELS
+# (для JPEG — после уменьшения draft-режимом) отклоняются, остальное
+# уменьшается до POST_IMAGE_MAX_SIDE. Пик памяти воркера на одну
+# загрузку не больше POST_UPLOAD_MAX_RSS, это проверяет test_uploads.
+FILE_UPLOAD_HANDLERS = ['posts.uploads.LimitedTemporaryFileUploadHandler']
+POST_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 8_000_000
+POST_IMAGE_MAX_SIDE = 1920
+POST_UPLOAD_MAX_RSS = 128 * 1024 * 1024
+
+# Кеш общий для всех процессов сервера: версии лент, фрагменты и ETag
+# должны совпадать у всех воркеров
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': '127.0.0.1:11211',
+    }
+}
+if TESTING:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
     }
+
+# Размер пачки при раскладке постов по лентам подписчиков
+TIMELINE_BATCH_SIZE = 1000
+# Посты авторов с большим числом подписчиков не раскладываются по лентам,
+# а подмешиваются при чтении из списка последних постов автора
+TIMELINE_FANOUT_THRESHOLD = 10000
+TIMELINE_RECENT_POSTS = 200
+TIMELINE_CACHE_TIMEOUT = 60 * 10
+
+# Метрики ответов по именам представлений, см. core/metrics.py. Файл
+# общий для всех процессов WSGI-сервера, доступен только владельцу.
+# /metrics отдаётся сотрудникам, адресам METRICS_ALLOWED_IPS и запросам
+# с заголовком Authorization: Bearer <METRICS_TOKEN>. За обратным прокси
+# REMOTE_ADDR — адрес прокси, поэтому адреса по умолчанию не открыты.
+METRICS_FILE = os.path.join(BASE_DIR, 'metrics')
+METRICS_SLOTS = 256
+METRICS_ALLOWED_IPS = []
+METRICS_TOKEN = ''
+
+# Журнал медленных запросов, см. core/slow_queries.py. Запросы дольше
+# порога пишутся в лог, итоги по отпечаткам SQL хранятся за два окна
+# и выводятся командой slow_queries.
+SLOW_QUERY_THRESHOLD = 0.1
+SLOW_QUERY_SAMPLE_RATE = 0.01
+SLOW_QUERY_WINDOW = 60 * 60
+SLOW_QUERY_PARAMS_CHARS = 200
+SLOW_QUERY_FILE = os.path.join(BASE_DIR, 'slow-queries')
+SLOW_QUERY_SLOTS = 256
+if TESTING:
+    # Файлы метрик и журнала запросов тестов — во временном каталоге,
+    # а не в файлах запущенного рядом сервера
+    TEST_FILES_DIR = tempfile.mkdtemp(prefix='yatube-test-')
+    atexit.register(shutil.rmtree, TEST_FILES_DIR, True)
+    METRICS_FILE = os.path.join(TEST_FILES_DIR, 'metrics')
+    SLOW_QUERY_FILE = os.path.join(TEST_FILES_DIR, 'slow-queries')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'yatube.slow_queries': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
 }